@@ -10,6 +10,12 @@ const View = require("../models/View");
 const axios = require("axios");
 const mongoose = require('mongoose');
 
+// Fire-and-forget notification to the recommendation service; failures are only logged
+const notifyRecommender = (req, route, body) => {
+    axios.post(req.app.locals.RECOMMENDATION_API_URL + route, body)
+        .catch(err => console.error(`Error notifying recommender (${route}):`, err.message));
+};
+
 exports.uploadVideo = async (req, res) => {
     const errors = validationResult(req);
     if (!errors.isEmpty()) {
@@ -131,6 +137,7 @@ exports.addView = async (req, res) => {
             await View.create({ userId, videoId });
             // Increment the view count
             await Video.findByIdAndUpdate(videoId, { $inc: { views: 1 } });
+            notifyRecommender(req, "/profiles/events", { type: "view", userId, videoId });
             isFirstView = true;
         }
         // Return the updated video with user data
@@ -165,6 +172,7 @@ exports.likeVideo = async (req, res) => {
         }
         await Like.create({ userId, videoId });
         await Video.findByIdAndUpdate(videoId, { $inc: { likeCount: 1 } });
+        notifyRecommender(req, "/profiles/events", { type: "like", userId, videoId });
         return res.status(200).json({ message: "Video liked" });
     } catch (err) {
         console.error("Error liking video:", err);
@@ -186,6 +194,7 @@ exports.dislikeVideo = async (req, res) => {
         }
         await Like.deleteOne({ userId, videoId });
         await Video.findByIdAndUpdate(videoId, { $inc: { likeCount: -1 } });
+        notifyRecommender(req, "/profiles/events", { type: "dislike", userId, videoId });
         return res.status(200).json({ message: "Video disliked" });
     } catch (err) {
         console.error("Error disliking video:", err);
@@ -207,6 +216,8 @@ exports.addComment = async (req, res) => {
         }
         const comment = await Comment.create({ userId, videoId, text });
         await Video.findByIdAndUpdate(videoId, { $inc: { commentCount: 1 } });
+        // Drop the recommender's cached comment summary for this video
+        notifyRecommender(req, "/cache/comments/invalidate", { videoId });
         // Populate user info for immediate UI rendering
         const populatedComment = await Comment.findById(comment._id)
             .populate('userId', 'userName displayName imageUrl');
@@ -246,8 +257,14 @@ exports.getComments = async (req, res) => {
 exports.getHomeRecommendations = async (req, res) => {
     try {
         const userId = req.user.id;
+        const { cursor, limit } = req.query;
         const apiUrl = req.app.locals.RECOMMENDATION_API_URL + "/recommend";
-        const response = await axios.post(apiUrl, { userId });
+        // Pass the cursor from the previous page to continue the same ranked feed session
+        const response = await axios.post(apiUrl, {
+            userId,
+            cursor: cursor || undefined,
+            limit: limit ? Math.min(Math.max(1, parseInt(limit) || 5), 20) : undefined,
+        });
         const data = response.data;
         // Ensure absolute URLs for any media paths returned by the recommendation service
         if (data && Array.isArray(data.recommended)) {
@@ -1,17 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_pymongo import PyMongo
 from bson import ObjectId
 import os
-import requests
 import json
 import time
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import re
+from caption_index import CaptionIndex, video_text
+from comment_summaries import CommentSummaryCache
+from retrieval import CandidateGenerator
+from catalog import CatalogSync
+from llm_client import LLMClient, CircuitBreaker
+from ranking_cache import RankingCache, FileRankingBackend
+from user_profiles import UserProfileStore, InteractionTailer
+from item_cf import ItemNeighbours, ItemCFSync
+from feed_sessions import FeedSessionStore, encode_cursor, decode_cursor
+from shared_index import SnapshotWatcher
+from worker_events import WorkerEvents
+from metrics import Metrics
+from batch_scoring import CandidateMatrix, score_chunk
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 load_dotenv()
 
@@ -28,6 +40,14 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# METRICS_DIR (set by gunicorn.conf.py) sums the histograms of every worker
+metrics = Metrics(directory=os.environ.get("METRICS_DIR") or None,
+                  flush_interval=float(os.environ.get("METRICS_FLUSH_SECONDS", 5)))
+metrics.describe("stage_seconds", "Time spent in each recommendation pipeline stage")
+metrics.describe("request_seconds", "End-to-end request latency per endpoint")
+# Per-request sampling profiler (?profile=1 or X-Profile: 1), off unless enabled here
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "False").lower() == "true"
+
 # MongoDB Config
 try:
     app.config["MONGO_URI"] = os.environ.get("MONGODB_URI")
@@ -44,24 +64,82 @@ LLM_API_KEY = os.environ.get("LLM_API_KEY")
 if not LLM_API_KEY:
     logger.warning("LLM_API_KEY not found - will use fallback methods")
 
-COHERE_API_URL = "https://api.cohere.ai/v1/generate"
+COHERE_API_URL = os.environ.get("LLM_API_URL", "https://api.cohere.ai/v1/generate")
+# End-to-end budget for LLM ranking before falling back to TF-IDF
+LLM_DEADLINE_MS = int(os.environ.get("LLM_DEADLINE_MS", 800))
+
+# Only the fields the rankers read
+VIDEO_PROJECTION = {"caption": 1, "createdAt": 1, "author": 1}
+
+# Candidate generation (stage one) sizes
+CANDIDATE_ANN = int(os.environ.get("CANDIDATE_ANN", 200))
+CANDIDATE_POPULAR = int(os.environ.get("CANDIDATE_POPULAR", 100))
+CANDIDATE_EXACT_ROWS = int(os.environ.get("CANDIDATE_EXACT_ROWS", 300000))
+
+# Batch scoring: shared candidate pool size, users scored per matrix product
+BATCH_CANDIDATES = int(os.environ.get("BATCH_CANDIDATES", 5000))
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 256))
+BATCH_MAX_USERS = int(os.environ.get("BATCH_MAX_USERS", 10000))
+
+# Item-item collaborative filtering: extra candidates drawn from neighbour lists
+ITEM_CF_CANDIDATES = int(os.environ.get("ITEM_CF_CANDIDATES", 100))
+
+# Feed sessions: items ranked per session, served page by page via a cursor
+FEED_SESSION_LENGTH = int(os.environ.get("FEED_SESSION_LENGTH", 200))
+# Shared session files so any worker process can serve a cursor
+FEED_SESSION_DIR = os.environ.get("FEED_SESSION_DIR")
+# Fan profile events and comment invalidations out to sibling workers
+WORKER_EVENTS_ENABLED = os.environ.get("WORKER_EVENTS_ENABLED", "False").lower() == "true"
+# LLM ranking cache (RANKING_CACHE_DIR shares it between worker processes)
+RANKING_CACHE_DIR = os.environ.get("RANKING_CACHE_DIR")
+
+# Caption index snapshot (optional, memory-mapped on load)
+CAPTION_INDEX_PATH = os.environ.get("CAPTION_INDEX_PATH")
+# Serving mode: map the indexes published by build_index.py instead of building them
+INDEX_SNAPSHOT_DIR = os.environ.get("INDEX_SNAPSHOT_DIR")
+
+
+def load_caption_index():
+    if CAPTION_INDEX_PATH and os.path.exists(os.path.join(CAPTION_INDEX_PATH, "meta.json")):
+        try:
+            return CaptionIndex.load(CAPTION_INDEX_PATH, id_parser=ObjectId)
+        except Exception as e:
+            logger.error(f"Caption index snapshot load failed: {e}")
+    return CaptionIndex()
+
+
+def create_ranking_cache():
+    backend = FileRankingBackend(RANKING_CACHE_DIR) if RANKING_CACHE_DIR else None
+    return RankingCache(
+        maxsize=int(os.environ.get("RANKING_CACHE_SIZE", 10000)),
+        ttl=int(os.environ.get("RANKING_CACHE_TTL", 300)),
+        stale_ttl=int(os.environ.get("RANKING_CACHE_STALE", 600)),
+        backend=backend
+    )
+
 
 class LLMVideoRecommender:
-    def __init__(self):
-        self.api_key = LLM_API_KEY
-        self.max_retries = 3
-        self.retry_delay = 2
+    def __init__(self, caption_index=None, llm_client=None, ranking_cache=None, item_cf=None):
+        self.llm = llm_client or LLMClient(
+            COHERE_API_URL,
+            LLM_API_KEY,
+            deadline=LLM_DEADLINE_MS / 1000,
+            pool_size=int(os.environ.get("LLM_POOL_SIZE", 32)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get("LLM_BREAKER_FAILURES", 5)),
+                reset_timeout=float(os.environ.get("LLM_BREAKER_RESET", 30))
+            )
+        )
+        self.caption_index = caption_index if caption_index is not None else CaptionIndex()
+        self.ranking_cache = ranking_cache if ranking_cache is not None else create_ranking_cache()
+        self.item_cf = item_cf
+        self._revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ranking-refresh")
 
     def call_llm_api(self, prompt, max_tokens=200):
-        if not self.api_key:
+        if not self.llm.api_key:
             logger.warning("No API key available for LLM")
             return None
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
         payload = {
             "model": "command",
             "prompt": prompt,
@@ -70,26 +148,15 @@ class LLMVideoRecommender:
             "stop_sequences": ["\n"]
         }
 
-        for attempt in range(self.max_retries):
-            try:
-                logger.info(f"LLM API call attempt {attempt + 1}/{self.max_retries}")
-                response = requests.post(COHERE_API_URL, headers=headers, json=payload, timeout=30)
-
-                if response.status_code == 200:
-                    result = response.json()
-                    if "generations" in result and result["generations"]:
-                        return result["generations"][0]["text"].strip()
-                elif response.status_code == 429:
-                    logger.warning("Rate limit hit, waiting longer")
-                    time.sleep(self.retry_delay * (attempt + 2))
-                else:
-                    logger.error(f"API Error {response.status_code}: {response.text}")
-            except Exception as e:
-                logger.error(f"LLM call failed: {e}")
-                time.sleep(self.retry_delay * (attempt + 1))
+        # Stale-while-revalidate refreshes call this off the request path;
+        # only calls a request waits on count towards the llm_call stage
+        with metrics.stage("llm_call") if metrics.in_request() else nullcontext():
+            result = self.llm.generate(payload)
+        if result and "generations" in result and result["generations"]:
+            return result["generations"][0]["text"].strip()
         return None
 
-    def rank_videos_with_llm(self, user_preferences, candidate_videos):
+    def rank_videos_with_llm(self, user_preferences, candidate_videos, profile=None, limit=5):
         try:
             if not candidate_videos:
                 return []
@@ -97,20 +164,78 @@ class LLMVideoRecommender:
             preference_text = self._summarize_preferences(user_preferences)
             limited_candidates = candidate_videos[:10]
 
-            video_summaries = [f"{i+1}. {v.get('caption', '')[:100]}..." for i, v in enumerate(limited_candidates)]
-            prompt = self._create_ranking_prompt(preference_text, video_summaries)
+            cache_key = self.ranking_cache.key(preference_text, [v["id"] for v in limited_candidates])
+            cached, state = self.ranking_cache.get(cache_key)
+            if cached is not None:
+                if state == "stale" and self.ranking_cache.begin_refresh(cache_key):
+                    self._revalidator.submit(self._refresh_ranking, cache_key, preference_text, limited_candidates)
+                ranked = self._apply_cached_ranking(cached, limited_candidates)
+                return self._extend_ranking(ranked, candidate_videos, user_preferences, profile, limit)
 
-            llm_response = self.call_llm_api(prompt, max_tokens=100)
+            ranked = self._llm_ranking(cache_key, preference_text, limited_candidates)
+            if ranked:
+                return self._extend_ranking(ranked, candidate_videos, user_preferences, profile, limit)
 
-            if llm_response:
-                return self._parse_ranking_response(llm_response, limited_candidates)
-
-            logger.warning("LLM failed - falling back to TF-IDF")
-            return self._tfidf_ranking(candidate_videos, user_preferences)
+            logger.warning("LLM failed - falling back to item CF / TF-IDF")
+            return self._fallback_ranking(candidate_videos, user_preferences, profile, limit)
 
         except Exception as e:
             logger.error(f"LLM ranking error: {e}")
-            return self._tfidf_ranking(candidate_videos, user_preferences)
+            return self._fallback_ranking(candidate_videos, user_preferences, profile, limit)
+
+    def _extend_ranking(self, ranked, candidate_videos, user_preferences, profile, limit):
+        # The LLM only orders the first candidates; longer lists continue in fallback order
+        if len(ranked) >= limit:
+            return ranked[:limit]
+        ranked_ids = {v["id"] for v in ranked}
+        rest = [v for v in candidate_videos if v["id"] not in ranked_ids]
+        if not rest:
+            return ranked
+        return ranked + self._fallback_ranking(rest, user_preferences, profile, limit - len(ranked))
+
+    def _fallback_ranking(self, candidate_videos, user_preferences, profile, limit=5):
+        if profile is not None and self.item_cf is not None:
+            with metrics.stage("item_cf"):
+                ranked = self._item_cf_ranking(candidate_videos, profile, limit)
+            if ranked:
+                return ranked
+        with metrics.stage("tfidf"):
+            return self._tfidf_ranking(candidate_videos, user_preferences, limit)
+
+    def _llm_ranking(self, cache_key, preference_text, limited_candidates):
+        video_summaries = [f"{i+1}. {v.get('caption', '')[:100]}..." for i, v in enumerate(limited_candidates)]
+        prompt = self._create_ranking_prompt(preference_text, video_summaries)
+
+        llm_response = self.call_llm_api(prompt, max_tokens=100)
+        if not llm_response:
+            return None
+
+        ranked = self._parse_ranking_response(llm_response, limited_candidates)
+        if any(v.get("ranking_method") == "llm" for v in ranked):
+            self.ranking_cache.put(cache_key, [
+                [v["id"], v["llm_rank"], v["llm_score"], v["ranking_method"]] for v in ranked
+            ])
+        return ranked
+
+    def _refresh_ranking(self, cache_key, preference_text, limited_candidates):
+        try:
+            self._llm_ranking(cache_key, preference_text, limited_candidates)
+        except Exception as e:
+            logger.warning(f"Ranking revalidation failed: {e}")
+        finally:
+            self.ranking_cache.end_refresh(cache_key)
+
+    def _apply_cached_ranking(self, cached, candidate_videos):
+        by_id = {v["id"]: v for v in candidate_videos}
+        ranked = []
+        for video_id, rank, score, method in cached:
+            if video_id in by_id:
+                v = by_id[video_id].copy()
+                v["llm_rank"] = rank
+                v["llm_score"] = score
+                v["ranking_method"] = method
+                ranked.append(v)
+        return ranked
 
     def _summarize_preferences(self, user_preferences):
         captions = [v.get('caption', '').strip() for v in user_preferences[:5] if v.get('caption')]
@@ -152,34 +277,52 @@ Ranking (numbers only, comma-separated):"""
             logger.error(f"Parse LLM ranking error: {e}")
             return self._tfidf_ranking(candidate_videos, [])
 
-    def _tfidf_ranking(self, candidate_videos, liked_videos):
+    def _item_cf_ranking(self, candidate_videos, profile, limit=5):
+        # None when too few candidates co-occur with the user's recent likes
         try:
-            liked_captions = [v.get("caption", "") for v in liked_videos if v.get("caption")]
-            candidate_captions = [v.get("caption", "") for v in candidate_videos if v.get("caption")]
+            items = self.item_cf.item_ids.lookup([v["video_id_obj"] for v in candidate_videos])
+            scores = self.item_cf.score(_cf_items(profile), [], items)
+            if np.count_nonzero(scores) < min(5, len(candidate_videos)):
+                return None
 
-            if not liked_captions or not candidate_captions:
-                return self._simple_fallback(candidate_videos)
+            top = float(scores.max())
+            for v, score in zip(candidate_videos, scores):
+                v["llm_score"] = float(score) / top
+                v["ranking_method"] = "item_cf"
 
-            tfidf = TfidfVectorizer(stop_words="english")
-            all_text = liked_captions + candidate_captions
-            matrix = tfidf.fit_transform(all_text)
+            return sorted(candidate_videos, key=lambda x: x["llm_score"], reverse=True)[:limit]
 
-            liked_vec = np.mean(matrix[:len(liked_captions)].toarray(), axis=0).reshape(1, -1)
-            candidate_vecs = matrix[len(liked_captions):]
+        except Exception as e:
+            logger.error(f"Item CF ranking failed: {e}")
+            return None
 
-            sims = cosine_similarity(liked_vec, candidate_vecs).flatten()
+    def _tfidf_ranking(self, candidate_videos, liked_videos, limit=5):
+        try:
+            liked_with_text = [v for v in liked_videos if v.get("caption")]
+            candidates_with_text = [v for v in candidate_videos if v.get("caption")]
+
+            if not liked_with_text or not candidates_with_text:
+                return self._simple_fallback(candidate_videos, limit)
+
+            # Index any videos not seen yet, then score with a sparse mat-vec
+            self.caption_index.add((v["video_id_obj"], video_text(v)) for v in liked_with_text + candidates_with_text)
+            user_vec = self.caption_index.user_vector([v["video_id_obj"] for v in liked_with_text])
+            if user_vec is None:
+                return self._simple_fallback(candidate_videos, limit)
 
-            for i, (v, score) in enumerate(zip(candidate_videos, sims)):
+            sims = self.caption_index.score(user_vec, [v["video_id_obj"] for v in candidate_videos])
+
+            for v, score in zip(candidate_videos, sims):
                 v["llm_score"] = float(score)
                 v["ranking_method"] = "hybrid_tfidf"
 
-            return sorted(candidate_videos, key=lambda x: x["llm_score"], reverse=True)[:5]
+            return sorted(candidate_videos, key=lambda x: x["llm_score"], reverse=True)[:limit]
 
         except Exception as e:
             logger.error(f"TF-IDF fallback failed: {e}")
-            return self._simple_fallback(candidate_videos)
+            return self._simple_fallback(candidate_videos, limit)
 
-    def _simple_fallback(self, videos):
+    def _simple_fallback(self, videos, limit=5):
         logger.warning("Using simple fallback (recency)")
         try:
             videos_sorted = sorted(
@@ -188,81 +331,427 @@ Ranking (numbers only, comma-separated):"""
             for i, v in enumerate(videos_sorted):
                 v["llm_score"] = 1.0 - i / len(videos_sorted)
                 v["ranking_method"] = "fallback_recent"
-            return videos_sorted[:5]
+            return videos_sorted[:limit]
         except Exception as e:
             logger.error(f"Simple fallback failed: {e}")
-            return videos[:5]
+            return videos[:limit]
+
+item_cf = ItemNeighbours(n_neighbours=int(os.environ.get("ITEM_CF_NEIGHBOURS", 50)))
+recommender = LLMVideoRecommender(caption_index=load_caption_index(), item_cf=item_cf)
+comment_summaries = CommentSummaryCache(
+    maxsize=int(os.environ.get("COMMENT_CACHE_SIZE", 50000)),
+    ttl=int(os.environ.get("COMMENT_CACHE_TTL", 600))
+)
+
+
+candidate_generator = CandidateGenerator(
+    recommender.caption_index,
+    ann_candidates=CANDIDATE_ANN,
+    popular_candidates=CANDIDATE_POPULAR,
+    exact_rows=CANDIDATE_EXACT_ROWS
+)
+catalog = CatalogSync(
+    lambda: mongo.db,
+    recommender.caption_index,
+    candidate_generator,
+    comment_summaries,
+    interval=int(os.environ.get("CATALOG_SYNC_INTERVAL", 30)),
+    stats_interval=int(os.environ.get("CATALOG_STATS_INTERVAL", 300))
+)
+
+
+user_profiles = UserProfileStore(
+    lambda: mongo.db,
+    item_ids=item_cf.item_ids,
+    maxsize=int(os.environ.get("PROFILE_CACHE_SIZE", 50000)),
+    ttl=int(os.environ.get("PROFILE_CACHE_TTL", 3600))
+)
+interaction_tailer = InteractionTailer(
+    lambda: mongo.db,
+    user_profiles,
+    interval=int(os.environ.get("INTERACTION_POLL_INTERVAL", 5)),
+    listeners=[item_cf.apply]
+)
+item_cf_sync = ItemCFSync(
+    lambda: mongo.db,
+    item_cf,
+    interval=int(os.environ.get("ITEM_CF_REFRESH_INTERVAL", 60)),
+    rebuild_interval=int(os.environ.get("ITEM_CF_REBUILD_INTERVAL", 3600))
+)
+feed_sessions = FeedSessionStore(
+    maxsize=int(os.environ.get("FEED_SESSION_CACHE_SIZE", 10000)),
+    ttl=int(os.environ.get("FEED_SESSION_TTL", 1800)),
+    backend=FileRankingBackend(
+        FEED_SESSION_DIR,
+        max_entries=int(os.environ.get("FEED_SESSION_FILES", 100000))
+    ) if FEED_SESSION_DIR else None,
+    id_parser=ObjectId
+)
+
+
+def _apply_profile_event(event_type, user_id, video_id):
+    updated = user_profiles.apply(event_type, user_id, video_id)
+    item_cf.apply(event_type, user_id, video_id)
+    return updated
+
+
+worker_events = WorkerEvents(
+    lambda: mongo.db,
+    dict(
+        dict.fromkeys(("like", "dislike", "view"), lambda e: _apply_profile_event(e["type"], e["userId"], e["videoId"])),
+        comments=lambda e: comment_summaries.invalidate(e["videoId"])
+    ),
+    interval=float(os.environ.get("WORKER_EVENT_POLL_INTERVAL", 1))
+) if WORKER_EVENTS_ENABLED else None
+
+
+def _profile_vector(profile):
+    # Preference vector over all liked captions, updated incrementally on the profile
+    return profile.preference_vector(recommender.caption_index, user_profiles.item_ids)
+
+
+def _cf_items(profile):
+    # Item CF works from the most recent likes, which bounds the gather for heavy users
+    def compute():
+        items = item_cf.item_ids.lookup(profile.recent_likes)
+        return items[items >= 0]
+
+    return profile.memo("cf_items", compute)
+
+
+def _profile_exclude_rows(profile):
+    index = recommender.caption_index
+    item_ids = user_profiles.item_ids
+
+    def compute():
+        rows = (index.row_of(item_ids.video_id(i)) for i in profile.seen)
+        return np.array([r for r in rows if r is not None], dtype=np.int64)
+
+    # Growth of the index can map seen videos that were unindexed before
+    return profile.memo("exclude_rows", compute, stamp=(index.version, len(index)))
+
+
+def apply_snapshot(snapshot):
+    # Swap a published snapshot in; in-flight requests finish on the old one
+    snapshot.caption_index.version = recommender.caption_index.version + 1
+    candidate_generator.attach(snapshot.caption_index, snapshot.candidate_state)
+    recommender.caption_index = snapshot.caption_index
+    if snapshot.item_ids is not None:
+        item_cf.attach(snapshot.item_ids, snapshot.nbr_idx, snapshot.nbr_sim,
+                       built_at=snapshot.manifest.get("item_cf_built_at", 0.0))
+        user_profiles.remap(snapshot.item_ids)
+
+
+snapshot_watcher = SnapshotWatcher(
+    INDEX_SNAPSHOT_DIR,
+    apply_snapshot,
+    id_parser=ObjectId,
+    interval=int(os.environ.get("SNAPSHOT_POLL_INTERVAL", 10))
+) if INDEX_SNAPSHOT_DIR else None
+
+
+def ensure_indexes():
+    # Workers map the builder's snapshot; a standalone process builds its own
+    if snapshot_watcher is not None:
+        snapshot_watcher.ensure_ready()
+    else:
+        catalog.ensure_ready()
+        item_cf_sync.ensure_ready()
+    interaction_tailer.start()
+    if worker_events is not None:
+        worker_events.start()
+
+
+def warm_catalog(save=True):
+    # Build the catalog indexes once at startup instead of on the first request.
+    # save=False for worker processes: they may share CAPTION_INDEX_PATH, so
+    # only a single writer (the standalone process) updates it.
+    try:
+        ensure_indexes()
+        if save and CAPTION_INDEX_PATH and snapshot_watcher is None and recommender.caption_index.is_fitted:
+            recommender.caption_index.save(CAPTION_INDEX_PATH)
+    except Exception as e:
+        logger.error(f"Caption index warm-up failed: {e}")
+
+
+def _video_data(v, summaries):
+    return {
+        "id": str(v["_id"]),
+        "video_id_obj": v["_id"],
+        "caption": v.get("caption", ""),
+        "comments_summary": summaries.get(v["_id"], ""),
+        "created_at": v.get("createdAt", ""),
+        "author": v.get("author", "")
+    }
+
+
+def _fetch_videos(video_ids):
+    # Full documents for the given ids, in the given order
+    if not video_ids:
+        return []
+    docs = {v["_id"]: v for v in mongo.db.Videos.find({"_id": {"$in": video_ids}}, VIDEO_PROJECTION)}
+    return [docs[vid] for vid in video_ids if vid in docs]
+
+
+def _batch_candidates():
+    rows, popularity = candidate_generator.popular_rows(BATCH_CANDIDATES)
+    return CandidateMatrix(recommender.caption_index, user_profiles.item_ids, rows, popularity)
+
+
+def batch_recommendations(user_ids, limit):
+    # Yields one result per requested user id, in order. Profiles are loaded
+    # with one `$in` query per collection per chunk, and every user in the
+    # chunk is scored against the shared popularity pool in one product.
+    candidates = _batch_candidates()
+    for start in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+        chunk = user_ids[start:start + BATCH_CHUNK_SIZE]
+        parsed = [_parse_object_id(raw) for raw in chunk]
+        valid = [uid for uid in parsed if uid is not None]
+        with metrics.stage("interaction_fetch"):
+            profiles = user_profiles.get_many(valid)
+        users = [profiles[uid] for uid in valid]
+        with metrics.stage("batch_score"):
+            # Vectors first, then the version check: a refit swapped in while
+            # they were computed rebuilds the candidates and the vectors
+            vectors = [_profile_vector(p) for p in users]
+            if candidates.version != recommender.caption_index.version:
+                candidates = _batch_candidates()
+                vectors = [_profile_vector(p) for p in users]
+            ranked, has_vector = score_chunk(candidates, users, vectors, limit)
+
+        video_ids = list(dict.fromkeys(candidates.video_ids[c] for r in ranked for c, _ in r))
+        with metrics.stage("videos_scan"):
+            docs = {v["_id"]: v for v in _fetch_videos(video_ids)}
+        results = iter(zip(ranked, has_vector))
+        for raw, uid in zip(chunk, parsed):
+            if uid is None:
+                yield {"userId": str(raw), "error": "Invalid userId"}
+                continue
+            items, personalised = next(results)
+            method = "batch_tfidf" if personalised else "batch_popular"
+            recommended = []
+            for col, score in items:
+                doc = docs.get(candidates.video_ids[col])
+                if doc is None:
+                    continue
+                recommended.append({
+                    "videoId": str(doc["_id"]),
+                    "caption": doc.get("caption", ""),
+                    "author": doc.get("author", ""),
+                    "rank": len(recommended) + 1,
+                    "score": round(float(score), 4),
+                    "method": method
+                })
+            yield {"userId": str(uid), "recommended": recommended}
+
+
+def _feed_page(session_id, offset, user_object_id, profile, limit):
+    def seen_mask(video_ids):
+        return profile.seen_mask(user_profiles.item_ids.lookup(video_ids))
+
+    return feed_sessions.page(session_id, offset, user_object_id, limit, seen_mask)
+
+
+def _feed_response(user_id, start_time, session_id, page, cache_state):
+    items, next_offset, metadata = page
+    with metrics.stage("serialization"):
+        metadata = dict(
+            metadata,
+            user_id=user_id,
+            processing_time=round(time.time() - start_time, 2),
+            next_cursor=encode_cursor(session_id, next_offset) if next_offset is not None else None,
+            session=cache_state
+        )
+        report = metrics.report()
+        if report is not None:
+            metadata["debug"] = report
+        return jsonify({"recommended": items, "metadata": metadata})
+
+
+def _parse_object_id(value):
+    # ObjectId(None) would mint a fresh id, so anything but a valid id is None
+    return ObjectId(value) if value is not None and ObjectId.is_valid(value) else None
+
+
+def _parse_limit(data):
+    # Page size clamped to 1..20; ValueError/TypeError if not an integer
+    return max(1, min(int(data.get("limit", 5)), 20))
+
+
+def _profile_requested():
+    if not PROFILING_ENABLED:
+        return False
+    return request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"
 
-recommender = LLMVideoRecommender()
 
 @app.route('/recommend', methods=['POST'])
 def recommend():
+    with metrics.request("recommend", profile=_profile_requested()):
+        return _recommend()
+
+
+def _recommend():
     start_time = time.time()
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object body"}), 400
         user_id = data.get("userId")
-        limit = min(data.get("limit", 5), 20)
-        user_object_id = ObjectId(user_id)
+        user_object_id = _parse_object_id(user_id)
+        if user_object_id is None:
+            return jsonify({"error": "Missing or invalid userId"}), 400
+        try:
+            limit = _parse_limit(data)
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be an integer"}), 400
+        cursor = data.get("cursor") or request.args.get("cursor")
 
-        likes = mongo.db.Likes.find({"userId": user_object_id})
-        views = mongo.db.Views.find({"userId": user_object_id})
+        try:
+            ensure_indexes()
+        except Exception as e:
+            logger.error(f"Catalog sync failed: {e}")
+
+        with metrics.stage("interaction_fetch"):
+            profile = user_profiles.get(user_object_id)
+
+        # Later pages come from the session's ranked list; an unknown or
+        # expired cursor starts a new session below
+        if cursor:
+            decoded = decode_cursor(cursor)
+            with metrics.stage("session_page"):
+                page = _feed_page(decoded[0], decoded[1], user_object_id, profile, limit) if decoded else None
+            if page is not None:
+                return _feed_response(user_id, start_time, decoded[0], page, "hit")
+
+        # Stage one: ANN over caption vectors + recency/popularity shortlist
+        with metrics.stage("candidate_filter"):
+            user_vec = _profile_vector(profile)
+            candidate_ids = candidate_generator.generate(user_vec, exclude_rows=_profile_exclude_rows(profile))
+            if len(item_cf):
+                cf_items, _ = item_cf.recommend(_cf_items(profile), [], ITEM_CF_CANDIDATES, exclude=profile.seen)
+                known = set(candidate_ids)
+                candidate_ids += [vid for vid in map(item_cf.item_ids.video_id, cf_items.tolist())
+                                  if vid not in known]
+
+        with metrics.stage("videos_scan"):
+            if candidate_ids:
+                video_docs = _fetch_videos(candidate_ids)
+            else:
+                # Catalog not indexed (yet) - newest videos the user has not seen
+                video_docs = list(mongo.db.Videos.find({}, VIDEO_PROJECTION).sort("createdAt", -1).limit(1000))
+                seen = profile.seen_mask(user_profiles.item_ids.lookup([v["_id"] for v in video_docs]))
+                video_docs = [v for v, s in zip(video_docs, seen) if not s]
+            liked_docs = _fetch_videos(list(profile.recent_likes))
+
+        with metrics.stage("comment_fetch"):
+            summaries = comment_summaries.get_many(mongo.db.Comments, [v["_id"] for v in video_docs + liked_docs])
+        candidates = [_video_data(v, summaries) for v in video_docs]
+        liked_videos = [_video_data(v, summaries) for v in liked_docs]
+
+        # Rank a whole session's worth of feed once; pages are sliced from it
+        recommendations = recommender.rank_videos_with_llm(liked_videos, candidates, profile,
+                                                           limit=max(FEED_SESSION_LENGTH, limit))
+
+        with metrics.stage("session_store"):
+            response = [{
+                "videoId": v["id"],
+                "caption": v["caption"],
+                "author": v.get("author", ""),
+                "rank": v.get("llm_rank", i + 1),
+                "score": v.get("llm_score", 0.0),
+                "method": v.get("ranking_method", "unknown")
+            } for i, v in enumerate(recommendations)]
+
+            metadata = {"total_candidates": len(candidates), "user_liked_count": len(liked_videos)}
+            session_id = feed_sessions.create(user_object_id, [v["video_id_obj"] for v in recommendations],
+                                              response, metadata)
+        page = (response[:limit], limit if limit < len(response) else None, metadata)
+        return _feed_response(user_id, start_time, session_id, page, "new")
 
-        liked_ids = [d["videoId"] for d in likes if "videoId" in d]
-        viewed_ids = [d["videoId"] for d in views if "videoId" in d]
-        interacted_ids = set(liked_ids + viewed_ids)
+    except Exception as e:
+        logger.error(f"Recommendation error: {e}")
+        return jsonify({"error": "Internal server error"}), 500
 
-        videos = []
-        liked_videos = []
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    # NDJSON stream, one line per user, for precomputing home feeds
+    data = request.get_json() or {}
+    user_ids = data.get("userIds")
+    if not isinstance(user_ids, list) or not user_ids:
+        return jsonify({"error": "userIds must be a non-empty list"}), 400
+    if len(user_ids) > BATCH_MAX_USERS:
+        return jsonify({"error": f"At most {BATCH_MAX_USERS} users per request"}), 400
+    try:
+        limit = _parse_limit(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
 
-        for v in mongo.db.Videos.find({}).limit(1000):
+    def generate():
+        # Timed over the whole stream, which is where the work happens
+        with metrics.request("recommend_batch"):
+            try:
+                ensure_indexes()
+            except Exception as e:
+                logger.error(f"Catalog sync failed: {e}")
             try:
-                video_id = v["_id"]
-                caption = v.get("caption", "")
-                comments = mongo.db.Comments.find({"videoId": video_id}).limit(3)
-                comments_summary = " ".join([c.get("text", "").strip() for c in comments])
-
-                vid_data = {
-                    "id": str(video_id),
-                    "video_id_obj": video_id,
-                    "caption": caption,
-                    "comments_summary": comments_summary[:200],
-                    "created_at": v.get("createdAt", ""),
-                    "author": v.get("author", "")
-                }
-
-                if video_id in liked_ids:
-                    liked_videos.append(vid_data)
-
-                videos.append(vid_data)
+                for result in batch_recommendations(user_ids, limit):
+                    yield json.dumps(result) + "\n"
             except Exception as e:
-                logger.warning(f"Error processing video: {e}")
-
-        candidates = [v for v in videos if v["video_id_obj"] not in interacted_ids]
-
-        recommendations = recommender.rank_videos_with_llm(liked_videos, candidates)
-
-        response = [{
-            "videoId": v["id"],
-            "caption": v["caption"],
-            "author": v.get("author", ""),
-            "rank": v.get("llm_rank", i + 1),
-            "score": v.get("llm_score", 0.0),
-            "method": v.get("ranking_method", "unknown")
-        } for i, v in enumerate(recommendations[:limit])]
-
-        return jsonify({
-            "recommended": response,
-            "metadata": {
-                "user_id": user_id,
-                "processing_time": round(time.time() - start_time, 2),
-                "total_candidates": len(candidates),
-                "user_liked_count": len(liked_videos)
-            }
-        })
+                logger.error(f"Batch recommendation error: {e}")
+                yield json.dumps({"error": "Internal server error"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route('/cache/comments/invalidate', methods=['POST'])
+def invalidate_comment_summary():
+    try:
+        data = request.get_json() or {}
+        video_id = _parse_object_id(data.get("videoId"))
+        if video_id is None:
+            return jsonify({"error": "Invalid videoId"}), 400
+        removed = comment_summaries.invalidate(video_id)
+        if worker_events is not None:
+            worker_events.publish("comments", videoId=video_id)
+        return jsonify({"invalidated": removed})
+    except Exception as e:
+        logger.warning(f"Comment cache invalidation failed: {e}")
+        return jsonify({"error": "Invalid videoId"}), 400
 
+@app.route('/profiles/events', methods=['POST'])
+def profile_event():
+    # Like/dislike/view writes from the Node backend
+    try:
+        data = request.get_json() or {}
+        event_type = data.get("type")
+        if event_type not in ("like", "dislike", "view"):
+            return jsonify({"error": "Invalid event type"}), 400
+        user_id, video_id = _parse_object_id(data.get("userId")), _parse_object_id(data.get("videoId"))
+        if user_id is None or video_id is None:
+            return jsonify({"error": "Invalid userId or videoId"}), 400
+        updated = _apply_profile_event(event_type, user_id, video_id)
+        if worker_events is not None:
+            worker_events.publish(event_type, userId=user_id, videoId=video_id)
+        return jsonify({"updated": updated})
     except Exception as e:
-        logger.error(f"Recommendation error: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+        logger.warning(f"Profile event failed: {e}")
+        return jsonify({"error": "Invalid userId or videoId"}), 400
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "ranking": recommender.ranking_cache.stats(),
+        "comments": comment_summaries.stats(),
+        "llm": recommender.llm.stats(),
+        "profiles": user_profiles.stats(),
+        "item_cf": item_cf.stats(),
+        "feed_sessions": feed_sessions.stats(),
+        "worker_events": worker_events.stats() if worker_events is not None else None
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text exposition: per-stage and per-endpoint latency histograms
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.errorhandler(404)
 def not_found(error):
@@ -276,6 +765,7 @@ if __name__ == '__main__':
     try:
         port = int(os.environ.get("RECOMMENDATION_API_PORT", 5000))
         debug_mode = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
+        warm_catalog()
         app.run(debug=debug_mode, port=port, host='0.0.0.0')
     except Exception as e:
         logger.error(f"Startup error: {e}")
@@ -0,0 +1,33 @@
+# Offline batch recommendations, e.g. for precomputing home feeds:
+#
+#   python batch_recommend.py users.txt --limit 20 --output feeds.ndjson
+#
+# Reads one userId per line (`-` for stdin) and writes one NDJSON line per
+# user, using the same scoring as POST /recommend/batch.
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch video recommendations as NDJSON")
+    parser.add_argument("users", help="file with one userId per line, or - for stdin")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--output", default="-", help="output file, or - for stdout")
+    args = parser.parse_args()
+
+    import app
+
+    source = sys.stdin if args.users == "-" else open(args.users)
+    with source:
+        user_ids = [line.strip() for line in source if line.strip()]
+
+    app.ensure_indexes()
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    with out:
+        for result in app.batch_recommendations(user_ids, args.limit):
+            out.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CandidateMatrix:
+    # Shared candidate set for batch scoring: caption rows, their item ids
+    # in the interaction ItemIdMap, and a normalised popularity prior.
+
+    def __init__(self, caption_index, item_ids, rows, popularity):
+        self.item_ids = item_ids
+        self.version = caption_index.version
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.video_ids = [caption_index.video_id_at(r) for r in self.rows]
+        matrix = caption_index.matrix[self.rows]
+        self.n_features = matrix.shape[1]
+        # Only vocabulary terms that occur in some candidate affect the
+        # scores, so user vectors are densified over those columns alone.
+        self.columns = np.unique(matrix.indices)
+        self.matrix = matrix[:, self.columns].tocsr()
+        popularity = np.asarray(popularity, dtype=np.float32)
+        top = popularity.max() if len(popularity) else 0
+        self.prior = popularity / top if top > 0 else np.zeros(len(self.rows), dtype=np.float32)
+        self.items = np.full(len(self.rows), -1, dtype=np.int64)
+        self.column_of = np.full(1, -1, dtype=np.int64)
+        self._mapped = -1
+        self.sync_items()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def sync_items(self):
+        # Loading profiles assigns new item ids, so candidates unknown at the
+        # last sync may have one now. Existing assignments never change.
+        size = len(self.item_ids)
+        if size == self._mapped:
+            return
+        unknown = np.flatnonzero(self.items < 0)
+        if len(unknown):
+            self.items[unknown] = self.item_ids.lookup([self.video_ids[i] for i in unknown])
+        # item id -> candidate column (-1 when not a candidate)
+        self.column_of = np.full(max(size, 1), -1, dtype=np.int64)
+        known = self.items >= 0
+        self.column_of[self.items[known]] = np.flatnonzero(known)
+        self._mapped = size
+
+
+def score_chunk(candidates, profiles, vectors, limit, prior_weight=0.05):
+    # profiles/vectors: per-user UserProfile and preference vector (or None).
+    # One sparse x dense product scores every user in the chunk; seen items
+    # are masked by scattering -inf through candidates.column_of. A vector
+    # in another vocabulary (a refit raced the caller) counts as no vector.
+    candidates.sync_items()
+    n_users = len(profiles)
+    users = np.zeros((len(candidates.columns), n_users), dtype=np.float32)
+    has_vector = np.zeros(n_users, dtype=bool)
+    for j, vec in enumerate(vectors):
+        if vec is not None and vec.shape[0] == candidates.n_features:
+            users[:, j] = vec[candidates.columns]
+            has_vector[j] = True
+
+    scores = np.asarray(candidates.matrix @ users, dtype=np.float32)
+    scores += prior_weight * candidates.prior[:, None]
+
+    seen = [p.seen for p in profiles]
+    lengths = np.fromiter((len(s) for s in seen), dtype=np.int64, count=n_users)
+    if lengths.sum():
+        seen_items = np.concatenate(seen)
+        user_cols = np.repeat(np.arange(n_users), lengths)
+        in_range = seen_items < len(candidates.column_of)
+        cols = np.full(len(seen_items), -1, dtype=np.int64)
+        cols[in_range] = candidates.column_of[seen_items[in_range]]
+        hit = cols >= 0
+        scores[cols[hit], user_cols[hit]] = -np.inf
+
+    k = min(limit, len(candidates))
+    if k == 0:
+        return [[] for _ in range(n_users)], has_vector
+    top = np.argpartition(-scores, k - 1, axis=0)[:k]
+    top_scores = np.take_along_axis(scores, top, axis=0)
+    order = np.argsort(-top_scores, axis=0)
+    top = np.take_along_axis(top, order, axis=0)
+    top_scores = np.take_along_axis(top_scores, order, axis=0)
+
+    results = []
+    for j in range(n_users):
+        finite = np.isfinite(top_scores[:, j])
+        results.append(list(zip(top[finite, j].tolist(), top_scores[finite, j].tolist())))
+    return results, has_vector
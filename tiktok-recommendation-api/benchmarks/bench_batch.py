@@ -0,0 +1,57 @@
+# Users/sec on one core: a loop of single-user POST /recommend calls vs one
+# streamed POST /recommend/batch over the same users (cold profile cache).
+#
+#   python -m benchmarks.bench_batch [--users 2000] [--videos 20000]
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from threadpoolctl import threadpool_limits  # noqa: E402
+
+from benchmarks.harness import load_app  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--single", type=int, default=200, help="users timed through /recommend")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.2)
+    args = parser.parse_args()
+
+    appmod, db, users = load_app(latency_ms=args.latency_ms, n_videos=args.videos, n_users=args.users,
+                                 comments_per_video=1)
+    client = appmod.app.test_client()
+    user_ids = [str(u) for u in users]
+    print(f"users={len(user_ids)} videos={args.videos} round trip={args.latency_ms}ms "
+          f"batch candidates={appmod.BATCH_CANDIDATES} chunk={appmod.BATCH_CHUNK_SIZE}")
+
+    with threadpool_limits(limits=1):
+        appmod.user_profiles._profiles.clear()
+        db.round_trips = 0
+        t0 = time.perf_counter()
+        for uid in user_ids[:args.single]:
+            resp = client.post("/recommend", json={"userId": uid, "limit": args.limit})
+            assert resp.status_code == 200, resp.get_json()
+        elapsed = time.perf_counter() - t0
+        print(f"{'single /recommend':>20}: {args.single / elapsed:8.1f} users/s "
+              f"round_trips/user={db.round_trips / args.single:.1f}")
+
+        appmod.user_profiles._profiles.clear()
+        db.round_trips = 0
+        t0 = time.perf_counter()
+        resp = client.post("/recommend/batch", json={"userIds": user_ids, "limit": args.limit})
+        lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines() if line]
+        elapsed = time.perf_counter() - t0
+        assert len(lines) == len(user_ids) and all("recommended" in line for line in lines)
+        print(f"{'/recommend/batch':>20}: {len(lines) / elapsed:8.1f} users/s "
+              f"round_trips/user={db.round_trips / len(lines):.2f}")
+
+
+if __name__ == "__main__":
+    main()
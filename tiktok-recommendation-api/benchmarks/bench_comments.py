@@ -0,0 +1,92 @@
+# Per-stage latency of the /recommend catalog load: the old per-video
+# Comments query (N+1 round trips), one unbounded `$in` find, and the
+# capped aggregation plus the summary cache. Videos get many comments so
+# that what each approach transfers shows up in `documents`.
+#
+#   python -m benchmarks.bench_comments [--videos 1000] [--comments-per-video 50] [--latency-ms 0.5]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comment_summaries import CommentSummaryCache  # noqa: E402
+from benchmarks.fake_mongo import FakeDB  # noqa: E402
+from benchmarks.synthetic import populate  # noqa: E402
+
+
+def stage(timings, name, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    timings[name] = (time.perf_counter() - t0) * 1000
+    return result
+
+
+def legacy(db):
+    timings = {}
+    docs = stage(timings, "videos_scan", lambda: list(db.Videos.find({}).limit(1000)))
+
+    def comments():
+        out = {}
+        for v in docs:
+            cs = db.Comments.find({"videoId": v["_id"]}).limit(3)
+            out[v["_id"]] = " ".join([c.get("text", "").strip() for c in cs])[:200]
+        return out
+
+    stage(timings, "comment_fetch", comments)
+    return timings
+
+
+def unbounded_in(db):
+    timings = {}
+    docs = stage(timings, "videos_scan",
+                 lambda: list(db.Videos.find({}, {"caption": 1, "createdAt": 1, "author": 1}).limit(1000)))
+
+    def comments():
+        out = {}
+        for c in db.Comments.find({"videoId": {"$in": [v["_id"] for v in docs]}}, {"videoId": 1, "text": 1}):
+            out.setdefault(c["videoId"], []).append(c["text"])
+        return {vid: " ".join(texts[:3])[:200] for vid, texts in out.items()}
+
+    stage(timings, "comment_fetch", comments)
+    return timings
+
+
+def batched(db, cache):
+    timings = {}
+    docs = stage(timings, "videos_scan",
+                 lambda: list(db.Videos.find({}, {"caption": 1, "createdAt": 1, "author": 1}).limit(1000)))
+    stage(timings, "comment_fetch", lambda: cache.get_many(db.Comments, [v["_id"] for v in docs]))
+    return timings
+
+
+def report(name, timings, db):
+    stages = " ".join(f"{k}={v:.1f}ms" for k, v in timings.items())
+    print(f"{name:>22}: {stages} total={sum(timings.values()):.1f}ms "
+          f"round_trips={db.round_trips} documents={db.documents}")
+    db.round_trips = db.documents = 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--comments-per-video", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    db = FakeDB(latency=args.latency_ms / 1000)
+    populate(db, n_videos=args.videos, comments_per_video=args.comments_per_video)
+    print(f"videos={args.videos} comments/video={args.comments_per_video} "
+          f"simulated round trip={args.latency_ms}ms")
+
+    db.round_trips = db.documents = 0
+    report("per-video queries", legacy(db), db)
+    report("unbounded $in find", unbounded_in(db), db)
+    cache = CommentSummaryCache()
+    report("aggregate (cold cache)", batched(db, cache), db)
+    report("aggregate (warm cache)", batched(db, cache), db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Scroll latency of the home feed: every page recomputed through /recommend
+# (previous behaviour, no cursor) vs pages served from a feed session.
+#
+#   python -m benchmarks.bench_feed [--videos 20000] [--pages 10]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import load_app  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    appmod, db, users = load_app(latency_ms=args.latency_ms, n_videos=args.videos, n_users=args.users)
+    client = appmod.app.test_client()
+    print(f"videos={args.videos} users={args.users} pages={args.pages} limit={args.limit} "
+          f"round trip={args.latency_ms}ms")
+
+    recompute, first, scroll = [], [], []
+    for user in users:
+        body = {"userId": str(user), "limit": args.limit}
+        for _ in range(args.pages):
+            t0 = time.perf_counter()
+            client.post("/recommend", json=body)
+            recompute.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        cursor = client.post("/recommend", json=body).get_json()["metadata"]["next_cursor"]
+        first.append((time.perf_counter() - t0) * 1000)
+        for _ in range(args.pages - 1):
+            if not cursor:
+                break
+            t0 = time.perf_counter()
+            cursor = client.post("/recommend", json=dict(body, cursor=cursor)).get_json()["metadata"]["next_cursor"]
+            scroll.append((time.perf_counter() - t0) * 1000)
+
+    for name, samples in (("recompute per page", recompute), ("session first page", first),
+                          ("session scroll page", scroll)):
+        print(f"{name:>20}: p50={np.percentile(samples, 50):7.2f}ms p99={np.percentile(samples, 99):7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Item-item CF build time and memory on synthetic Likes/Views, plus the
+# cost of an incremental refresh and of serving one user.
+#
+#   python -m benchmarks.bench_item_cf [--interactions 1000000] [--items 100000]
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from item_cf import ItemNeighbours  # noqa: E402
+
+
+def interactions(n, n_users, n_items, n_topics, seed):
+    # Users draw from one or two topics with a Zipf-like popularity skew
+    rng = np.random.default_rng(seed)
+    per_topic = n_items // n_topics
+    users = rng.integers(0, n_users, n)
+    topics = (users * 7 + rng.integers(0, 2, n)) % n_topics
+    ranks = np.minimum(rng.zipf(1.3, n) - 1, per_topic - 1)
+    items = topics * per_topic + ranks
+    liked = rng.random(n) < 0.3
+    return users, items, liked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interactions", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--neighbours", type=int, default=50)
+    parser.add_argument("--dirty", type=int, default=1000)
+    args = parser.parse_args()
+
+    users, items, liked = interactions(args.interactions, args.users, args.items, args.topics, seed=0)
+    likes = list(zip(users[liked].tolist(), items[liked].tolist()))
+    views = list(zip(users.tolist(), items.tolist()))
+    print(f"interactions={args.interactions} (likes={len(likes)}) users={args.users} "
+          f"items={args.items} neighbours={args.neighbours}")
+
+    model = ItemNeighbours(n_neighbours=args.neighbours)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    model.load(likes, views)
+    build = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    idx, sim = model._table
+    filled = (idx >= 0).sum(axis=1)
+    print(f"build: {build:.1f}s peak={peak / 2**20:.0f} MiB table={(idx.nbytes + sim.nbytes) / 2**20:.1f} MiB "
+          f"interaction keys={(model.nbytes - idx.nbytes - sim.nbytes) / 2**20:.1f} MiB "
+          f"items with neighbours={np.count_nonzero(filled)}/{len(idx)}")
+
+    rng = np.random.default_rng(1)
+    for u, i in zip(rng.integers(0, args.users, args.dirty).tolist(), rng.integers(0, args.items, args.dirty).tolist()):
+        model.apply("like", u, i)
+    t0 = time.perf_counter()
+    refreshed = model.refresh()
+    print(f"refresh: {args.dirty} events, {refreshed} rows recomputed in {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    samples = []
+    sample_users = rng.integers(0, args.users, 200)
+    for u in sample_users:
+        mine = model.item_ids.lookup([i for uu, i in likes[:200000] if uu == u][:50])
+        t0 = time.perf_counter()
+        model.recommend(mine, [], 100, exclude=mine)
+        model.score(mine, [], rng.integers(0, len(idx), 400))
+        samples.append((time.perf_counter() - t0) * 1000)
+    print(f"serve (recommend 100 + score 400): p50={np.percentile(samples, 50):.2f}ms "
+          f"p99={np.percentile(samples, 99):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
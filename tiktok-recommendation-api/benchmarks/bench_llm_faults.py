@@ -0,0 +1,72 @@
+# /recommend latency with the LLM client pointed at a fault-injecting fake.
+#
+#   python -m benchmarks.bench_llm_faults [--requests 200] [--concurrency 8] [--deadline-ms 800]
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import load_app  # noqa: E402
+from benchmarks.fake_llm_server import serve  # noqa: E402
+from llm_client import LLMClient, CircuitBreaker  # noqa: E402
+
+SCENARIOS = {
+    "healthy": dict(latency_ms=80),
+    "slow (2s)": dict(latency_ms=2000),
+    "429 storm": dict(latency_ms=20, rate_429=1.0, retry_after=5),
+    "50% 5xx": dict(latency_ms=50, rate_5xx=0.5),
+    "20% 429 + 10% 5xx": dict(latency_ms=150, rate_429=0.2, rate_5xx=0.1),
+}
+
+
+def run(appmod, users, url, args):
+    appmod.recommender.llm = LLMClient(url, "benchmark-key", deadline=args.deadline_ms / 1000,
+                                       breaker=CircuitBreaker(failure_threshold=5, reset_timeout=2.0))
+
+    def one(i):
+        client = appmod.app.test_client()
+        t0 = time.perf_counter()
+        r = client.post("/recommend", json={"userId": str(users[i % len(users)]), "limit": 5})
+        elapsed = (time.perf_counter() - t0) * 1000
+        body = r.get_json() or {}
+        methods = {v["method"] for v in body.get("recommended", [])}
+        return elapsed, "llm" if methods & {"llm", "llm_unranked"} else "fallback"
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - t0
+    latencies = np.array([r[0] for r in results])
+    return latencies, Counter(r[1] for r in results), wall, appmod.recommender.llm.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--deadline-ms", type=int, default=800)
+    parser.add_argument("--videos", type=int, default=2000)
+    args = parser.parse_args()
+
+    appmod, _, users = load_app(n_videos=args.videos, n_users=100)
+    print(f"requests={args.requests} concurrency={args.concurrency} deadline={args.deadline_ms}ms")
+    for name, faults in SCENARIOS.items():
+        server, _, url = serve(**faults)
+        try:
+            latencies, methods, wall, stats = run(appmod, users, url, args)
+        finally:
+            server.shutdown()
+        print(f"{name:>18}: p50={np.percentile(latencies, 50):7.1f}ms p99={np.percentile(latencies, 99):7.1f}ms "
+              f"max={latencies.max():7.1f}ms rps={args.requests / wall:6.1f} "
+              f"llm={methods['llm']} fallback={methods['fallback']} "
+              f"timeouts={stats['timeout']} short_circuit={stats['short_circuit']} breaker={stats['breaker']}")
+
+
+if __name__ == "__main__":
+    main()
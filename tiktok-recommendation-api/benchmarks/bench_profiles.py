@@ -0,0 +1,90 @@
+# Per-request user state for heavy users: re-reading Likes/Views and list
+# membership checks (previous /recommend) vs the cached UserProfileStore.
+#
+#   python -m benchmarks.bench_profiles [--interactions 10000] [--catalog 50000]
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from caption_index import CaptionIndex  # noqa: E402
+from user_profiles import UserProfileStore  # noqa: E402
+from benchmarks.fake_mongo import FakeDB  # noqa: E402
+from benchmarks.synthetic import make_captions  # noqa: E402
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interactions", type=int, default=10000)
+    parser.add_argument("--catalog", type=int, default=50000)
+    parser.add_argument("--window", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    db = FakeDB(latency=args.latency_ms / 1000)
+    video_ids = [ObjectId() for _ in range(args.catalog)]
+    index = CaptionIndex().fit(zip(video_ids, make_captions(args.catalog)))
+    user = ObjectId()
+    now = datetime.utcnow()
+    for coll in (db.Likes, db.Views):
+        coll.insert_many([{"_id": ObjectId(), "userId": user, "videoId": v, "createdAt": now, "updatedAt": now}
+                          for v in rng.sample(video_ids, args.interactions)])
+        coll.create_index("userId")
+    window = rng.sample(video_ids, args.window)
+
+    def legacy():
+        liked_ids = [d["videoId"] for d in db.Likes.find({"userId": user}) if "videoId" in d]
+        viewed_ids = [d["videoId"] for d in db.Views.find({"userId": user}) if "videoId" in d]
+        interacted = set(liked_ids + viewed_ids)
+        liked = [v for v in window if v in liked_ids]
+        candidates = [v for v in window if v not in interacted]
+        index.user_vector([v for v in liked], cache=False)
+        return candidates
+
+    store = UserProfileStore(lambda: db)
+
+    def with_profile(profile):
+        vec = profile.preference_vector(index, store.item_ids)
+        mask = profile.seen_mask(store.item_ids.lookup(window))
+        return vec, [v for v, s in zip(window, mask) if not s]
+
+    def cold():
+        store._profiles.clear()
+        with_profile(store.get(user))
+
+    def warm():
+        with_profile(store.get(user))
+
+    def event():
+        store.apply("like", user, rng.choice(video_ids))
+
+    print(f"user: {args.interactions} likes + {args.interactions} views, window={args.window}, "
+          f"round trip={args.latency_ms}ms")
+    for name, fn in (("legacy lists", legacy), ("profile (cold)", cold), ("profile (warm)", warm),
+                     ("like event", event), ("warm after event", lambda: (event(), warm()))):
+        p50, p99 = timed(fn, args.repeat)
+        print(f"{name:>17}: p50={p50:8.2f}ms p99={p99:8.2f}ms")
+    profile = store.get(user)
+    print(f"profile arrays: {(profile.liked.nbytes + profile.viewed.nbytes) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# Recall@k and latency of CandidateGenerator (LSA projection + IVF + exact
+# re-rank) against exact TF-IDF cosine over CaptionIndex.matrix, plus how
+# long generate() stalls while the catalog is refitted.
+#
+#   python -m benchmarks.bench_retrieval [--sizes 10000 100000 1000000] [--corpus captions topics]
+#
+# The ANN path is measured at every size (--exact-rows 0); the app scores
+# catalogs up to CandidateGenerator.exact_rows exactly instead.
+#
+# `captions` is the synthetic caption generator used elsewhere (~90 terms);
+# `topics` draws Zipf-weighted words from per-topic vocabularies (~20k
+# terms), closer to real captions. Users like random videos (as in
+# benchmarks.synthetic) or videos from a few topics.
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_captions  # noqa: E402
+from caption_index import CaptionIndex  # noqa: E402
+from retrieval import CandidateGenerator, PopularityShortlist  # noqa: E402
+
+
+def topic_captions(n, rng, n_topics=300, vocab=20000, topic_words=200, length=8):
+    topics = [rng.choice(vocab, topic_words, replace=False) for _ in range(n_topics)]
+    weights = 1.0 / np.arange(1, topic_words + 1)
+    weights /= weights.sum()
+    labels = rng.integers(0, n_topics, n)
+    captions = [" ".join(f"w{w}" for w in rng.choice(topics[t], length, p=weights)) for t in labels]
+    return captions, labels
+
+
+def corpus(name, n, rng):
+    if name == "topics":
+        return topic_captions(n, rng)
+    captions = make_captions(n, seed=1)
+    # make_caption picks 3 words from one topic; recover it from the first topical word
+    from benchmarks.synthetic import TOPICS
+    topic_of = {w: i for i, words in enumerate(TOPICS.values()) for w in words}
+    labels = np.array([next(topic_of[w] for w in c.split() if w in topic_of) for c in captions])
+    return captions, labels
+
+
+def liked_sets(labels, n_users, rng, topical, liked=20):
+    users = []
+    for _ in range(n_users):
+        if topical:
+            pool = np.flatnonzero(np.isin(labels, rng.choice(labels.max() + 1, 3, replace=False)))
+        else:
+            pool = np.arange(len(labels))
+        users.append(rng.choice(pool, min(liked, len(pool)), replace=False))
+    return users
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def measure(index, generator, users, k):
+    recalls, ann_t, exact_t = [], [], []
+    for liked in users:
+        user_vec = index.user_vector(liked.tolist(), cache=False)
+        t0 = time.perf_counter()
+        scores = index.matrix @ user_vec
+        scores[liked] = -np.inf
+        exact = np.argpartition(-scores, k - 1)[:k]
+        exact_t.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        rows = generator.generate(user_vec, exclude_rows=liked)
+        ann_t.append(time.perf_counter() - t0)
+        recalls.append(len(np.intersect1d(rows, exact)) / k)
+    return np.mean(recalls), percentiles(ann_t), percentiles(exact_t)
+
+
+def refit_stall(index, generator, captions, n, users):
+    # Grow the catalog past the refit threshold, then refit in a thread
+    # while this thread keeps calling generate()
+    extra = [(n + i, c) for i, c in enumerate(captions[:n // 2 + 1])]
+    index.add(extra)
+    generator.update_stats([])
+    assert index.needs_refit
+    vectors = [index.user_vector(liked.tolist(), cache=False) for liked in users]
+    done, latencies = threading.Event(), []
+
+    def refit():
+        generator.refit()
+        done.set()
+
+    t0 = time.perf_counter()
+    threading.Thread(target=refit).start()
+    i = 0
+    while not done.is_set():
+        t1 = time.perf_counter()
+        generator.generate(vectors[i % len(vectors)])
+        latencies.append(time.perf_counter() - t1)
+        i += 1
+    return time.perf_counter() - t0, latencies
+
+
+def run(name, n, args, rng):
+    captions, labels = corpus(name, n, rng)
+    t0 = time.perf_counter()
+    index = CaptionIndex().fit(enumerate(captions))
+    generator = CandidateGenerator(index, dim=args.dim, n_probe=args.n_probe, ann_candidates=args.k,
+                                   popular_candidates=0, rerank=args.rerank, exact_rows=args.exact_rows)
+    generator.update_stats([])
+    build_s = time.perf_counter() - t0
+    print(f"{name:>7} n={n:>8} terms={index.matrix.shape[1]:>6} dim={generator._projector.dim} "
+          f"lists={len(generator.ann.centroids)} fit+build={build_s:5.1f}s")
+    for topical in (False, True):
+        users = liked_sets(labels, args.queries, rng, topical)
+        recall, (ann_p50, ann_p99), (exact_p50, exact_p99) = measure(index, generator, users, args.k)
+        print(f"{'':>9}{'topical' if topical else 'random':>8} users: recall@{args.k}={recall:.3f} "
+              f"generate p50={ann_p50:6.2f}ms p99={ann_p99:6.2f}ms | "
+              f"exact p50={exact_p50:7.2f}ms p99={exact_p99:7.2f}ms")
+
+    if args.stall:
+        refit_s, latencies = refit_stall(index, generator, captions, n, users)
+        p50, p99 = percentiles(latencies)
+        print(f"{'':>9}refit over {len(index)} videos took {refit_s:.1f}s; generate() meanwhile: "
+              f"{len(latencies)} calls p50={p50:.2f}ms p99={p99:.2f}ms max={max(latencies) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--corpus", nargs="+", default=["captions", "topics"])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--rerank", type=int, default=64)
+    parser.add_argument("--exact-rows", type=int, default=0, help="score catalogs up to this size exactly")
+    parser.add_argument("--k", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--n-probe", type=int, default=64)
+    parser.add_argument("--no-stall", dest="stall", action="store_false", help="skip the refit stall measurement")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for name in args.corpus:
+        for n in args.sizes:
+            run(name, n, args, rng)
+
+    popularity = PopularityShortlist()
+    now = time.time()
+    n = max(args.sizes)
+    popularity.set(np.arange(n), now - rng.uniform(0, 90 * 86400, n), rng.poisson(5, n), rng.poisson(50, n))
+    samples = []
+    for _ in range(args.queries):
+        t0 = time.perf_counter()
+        popularity.top(100, now=now)
+        samples.append(time.perf_counter() - t0)
+    print(f"popularity shortlist n={n}: p50={percentiles(samples)[0]:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Per-request TF-IDF refit (previous _tfidf_ranking) vs the persistent CaptionIndex.
+#
+#   python -m benchmarks.bench_tfidf [--catalog 1000] [--liked 20] [--requests 200]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from caption_index import CaptionIndex  # noqa: E402
+from benchmarks.synthetic import make_captions  # noqa: E402
+
+
+def per_request_fit(liked_captions, candidate_captions):
+    tfidf = TfidfVectorizer(stop_words="english")
+    matrix = tfidf.fit_transform(liked_captions + candidate_captions)
+    liked_vec = np.mean(matrix[:len(liked_captions)].toarray(), axis=0).reshape(1, -1)
+    return cosine_similarity(liked_vec, matrix[len(liked_captions):]).flatten()
+
+
+def timed(fn, n):
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples = np.array(samples)
+    return np.percentile(samples, 50), np.percentile(samples, 99), samples.mean()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", type=int, default=1000)
+    parser.add_argument("--liked", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    captions = make_captions(args.catalog)
+    ids = list(range(args.catalog))
+    rng = random.Random(1)
+    users = [rng.sample(ids, args.liked) for _ in range(args.requests)]
+
+    def legacy(i):
+        liked = set(users[i])
+        per_request_fit([captions[j] for j in users[i]], [captions[j] for j in ids if j not in liked])
+
+    t0 = time.perf_counter()
+    index = CaptionIndex().fit(zip(ids, captions))
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    def indexed(i):
+        liked = set(users[i])
+        index.score(index.user_vector(users[i]), [j for j in ids if j not in liked])
+
+    with tempfile.TemporaryDirectory() as path:
+        index.save(path)
+        t0 = time.perf_counter()
+        loaded = CaptionIndex.load(path, id_parser=int)
+        load_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"catalog={args.catalog} liked={args.liked} requests={args.requests}")
+    print(f"index build: {build_ms:.1f} ms, snapshot load (mmap): {load_ms:.1f} ms, rows={len(loaded)}")
+    for name, fn in (("per-request fit", legacy), ("caption index", indexed)):
+        p50, p99, mean = timed(fn, args.requests)
+        print(f"{name:>16}: p50={p50:.2f} ms p99={p99:.2f} ms mean={mean:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
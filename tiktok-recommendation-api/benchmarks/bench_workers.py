@@ -0,0 +1,110 @@
+# Worker cold start and memory for 1/4/16 concurrently starting workers:
+# each worker building its own indexes (standalone app.py) vs mapping a
+# snapshot published by build_index.py. Workers time `import app` the way
+# verify_import.py does, then get their indexes ready and touch every
+# index page (a fully warmed worker).
+#
+#   python -m benchmarks.bench_workers [--videos 50000] [--workers 1 4 16]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def memory():
+    # (rss, pss) in MiB; pss splits shared pages between the processes mapping them
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values.get("Rss:", 0.0), values.get("Pss:", 0.0)
+
+
+def child(mode, root, args):
+    os.environ.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/test")
+    os.environ.setdefault("FLASK_DEBUG", "False")
+    os.environ.setdefault("LLM_API_KEY", "")
+    for name in ("CATALOG_SYNC_INTERVAL", "INTERACTION_POLL_INTERVAL", "ITEM_CF_REFRESH_INTERVAL",
+                 "SNAPSHOT_POLL_INTERVAL"):
+        os.environ[name] = "0"
+    if mode == "snapshot":
+        os.environ["INDEX_SNAPSHOT_DIR"] = root
+    else:
+        from benchmarks.fake_mongo import FakeDB
+        from benchmarks.synthetic import populate
+
+        db = FakeDB()
+        populate(db, n_videos=args.videos, n_users=args.users, comments_per_video=0)
+
+    t0 = time.perf_counter()
+    import app
+    import_s = time.perf_counter() - t0
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    if mode != "snapshot":
+        from benchmarks.fake_mongo import FakeMongo
+        app.mongo = FakeMongo(db)
+    t0 = time.perf_counter()
+    app.ensure_indexes()
+    ready_s = time.perf_counter() - t0
+
+    index = app.recommender.caption_index
+    touched = float(index.matrix.data.sum())
+    ann = app.candidate_generator.ann
+    touched += float(ann._vectors.sum()) + float(app.item_cf.table()[1].sum())
+    rss, pss = memory()
+    print(json.dumps({"import": import_s, "ready": ready_s, "rss": rss, "pss": pss,
+                      "sklearn": "sklearn" in sys.modules, "videos": len(index), "touched": touched}))
+
+
+def run(mode, root, n_workers, args):
+    cmd = [sys.executable, "-m", "benchmarks.bench_workers", "--child", mode, "--root", root,
+           "--videos", str(args.videos), "--users", str(args.users)]
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    procs = [subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+             for _ in range(n_workers)]
+    results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    mean = {key: sum(r[key] for r in results) / len(results) for key in ("import", "ready", "rss", "pss")}
+    print(f"{mode:>10} x{n_workers:<3} import={mean['import']:.2f}s ready={mean['ready']:.2f}s "
+          f"cold start={mean['import'] + mean['ready']:.2f}s rss/worker={mean['rss']:.0f}MiB "
+          f"pss/worker={mean['pss']:.0f}MiB sklearn imported={any(r['sklearn'] for r in results)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--modes", nargs="+", default=["standalone", "snapshot"])
+    parser.add_argument("--child")
+    parser.add_argument("--root")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.root, args)
+        return
+
+    from benchmarks.harness import load_app
+    from shared_index import publish
+
+    with tempfile.TemporaryDirectory() as root:
+        t0 = time.perf_counter()
+        appmod, _, _ = load_app(n_videos=args.videos, n_users=args.users, comments_per_video=0)
+        publish(root, appmod.recommender.caption_index, appmod.candidate_generator, appmod.item_cf)
+        print(f"videos={args.videos} users={args.users} builder: {time.perf_counter() - t0:.1f}s "
+              f"(incl. synthetic data), cpus={os.cpu_count()}")
+        for mode in args.modes:
+            for n in args.workers:
+                run(mode, root, n, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Local stand-in for the Cohere generate endpoint with fault injection.
+#
+#   python -m benchmarks.fake_llm_server --port 8088 --latency-ms 300 --rate-429 0.2 --rate-5xx 0.1
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Faults:
+    def __init__(self, latency_ms=50, jitter_ms=20, rate_429=0.0, rate_5xx=0.0, retry_after=None, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+
+def _handler(faults):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body, headers=()):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in headers:
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            faults.requests += 1
+            roll = faults.rng.random()
+            delay = max(0.0, faults.latency_ms + faults.rng.uniform(-faults.jitter_ms, faults.jitter_ms)) / 1000
+            time.sleep(delay)
+            if roll < faults.rate_429:
+                headers = [("Retry-After", str(faults.retry_after))] if faults.retry_after is not None else []
+                return self._reply(429, {"message": "rate limited"}, headers)
+            if roll < faults.rate_429 + faults.rate_5xx:
+                return self._reply(503, {"message": "unavailable"})
+            count = len(re.findall(r"^\d+\. ", payload.get("prompt", ""), flags=re.M)) or 5
+            order = list(range(1, count + 1))
+            faults.rng.shuffle(order)
+            self._reply(200, {"generations": [{"text": ", ".join(map(str, order))}]})
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that hit their deadline hang up mid-response; that is expected
+        pass
+
+
+def serve(port=0, **fault_kwargs):
+    # Starts the server on a daemon thread; returns (server, faults, url)
+    faults = Faults(**fault_kwargs)
+    server = _Server(("127.0.0.1", port), _handler(faults))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, faults, f"http://127.0.0.1:{server.server_address[1]}/v1/generate"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=None)
+    args = parser.parse_args()
+    server, _, url = serve(args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           rate_429=args.rate_429, rate_5xx=args.rate_5xx, retry_after=args.retry_after)
+    print(f"Fake LLM listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
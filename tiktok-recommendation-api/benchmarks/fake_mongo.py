@@ -0,0 +1,209 @@
+# Minimal in-memory stand-in for the pymongo calls the recommender makes.
+# Every round trip (a find() plus one extra per `batch_size` documents)
+# sleeps for `latency` seconds so batched and per-document access patterns
+# can be compared the way they would behave against a real server.
+import time
+from collections import defaultdict
+
+
+def _match(doc, flt):
+    for field, cond in flt.items():
+        value = doc.get(field)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+                if op == "$gte" and not (value is not None and value >= arg):
+                    return False
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _prepare(flt):
+    # Turn $in/$nin lists into sets once per query instead of per document
+    out = {}
+    for field, cond in (flt or {}).items():
+        if isinstance(cond, dict):
+            cond = {op: (set(arg) if op in ("$in", "$nin") else arg) for op, arg in cond.items()}
+        out[field] = cond
+    return out
+
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+
+class FakeCursor:
+    def __init__(self, collection, flt, projection):
+        self._collection = collection
+        self._filter = _prepare(flt)
+        self._projection = projection
+        self._limit = 0
+        self._sort = None
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def sort(self, key, direction=1):
+        self._sort = (key, direction)
+        return self
+
+    def __iter__(self):
+        coll = self._collection
+        docs = coll._candidates(self._filter)
+        docs = [d for d in docs if _match(d, self._filter)]
+        if self._sort:
+            key, direction = self._sort
+            docs.sort(key=lambda d: (d.get(key) is not None, d.get(key)), reverse=direction < 0)
+        if self._limit:
+            docs = docs[:self._limit]
+        coll.db.round_trips += 1 + len(docs) // coll.db.batch_size
+        coll.db.documents += len(docs)
+        time.sleep(coll.db.latency * (1 + len(docs) // coll.db.batch_size))
+        for d in docs:
+            yield _project(d, self._projection)
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.docs = []
+        self._indexes = {}
+
+    def create_index(self, field, **options):
+        index = defaultdict(list)
+        for d in self.docs:
+            index[d.get(field)].append(d)
+        self._indexes[field] = index
+
+    def _candidates(self, flt):
+        for field, cond in flt.items():
+            index = self._indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(cond, dict) and "$in" in cond:
+                out = []
+                for v in cond["$in"]:
+                    out.extend(index.get(v, ()))
+                return out
+            if not isinstance(cond, dict):
+                return index.get(cond, [])
+        return self.docs
+
+    def insert_many(self, docs):
+        for d in docs:
+            self.docs.append(d)
+            for field, index in self._indexes.items():
+                index[d.get(field)].append(d)
+
+    def insert_one(self, doc):
+        self.insert_many([doc])
+
+    def delete_one(self, flt):
+        flt = _prepare(flt)
+        for i, d in enumerate(self.docs):
+            if _match(d, flt):
+                del self.docs[i]
+                for field, index in self._indexes.items():
+                    index[d.get(field)].remove(d)
+                return
+
+    def find(self, flt=None, projection=None):
+        return FakeCursor(self, flt, projection)
+
+    def aggregate(self, pipeline):
+        # Only the $match / $group ($push, $firstN) / $project ($slice)
+        # stages the recommender uses; one round trip per result batch
+        docs = None
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if op == "$match":
+                flt = _prepare(spec)
+                docs = [d for d in (self._candidates(flt) if docs is None else docs) if _match(d, flt)]
+            elif op == "$group":
+                key = spec["_id"].lstrip("$")
+                groups = {}
+                for d in self.docs if docs is None else docs:
+                    groups.setdefault(d.get(key), []).append(d)
+                out = []
+                for value, members in groups.items():
+                    row = {"_id": value}
+                    for name, (acc, arg) in ((n, next(iter(a.items()))) for n, a in spec.items() if n != "_id"):
+                        if acc == "$push":
+                            row[name] = [m.get(arg.lstrip("$")) for m in members]
+                        elif acc == "$firstN":
+                            row[name] = [m.get(arg["input"].lstrip("$")) for m in members[:arg["n"]]]
+                        else:
+                            raise NotImplementedError(acc)
+                    out.append(row)
+                docs = out
+            elif op == "$project":
+                out = []
+                for d in docs:
+                    row = {"_id": d["_id"]}
+                    for name, expr in spec.items():
+                        if isinstance(expr, dict) and "$slice" in expr:
+                            field, n = expr["$slice"]
+                            row[name] = d.get(field.lstrip("$"), [])[:n]
+                        elif expr:
+                            row[name] = d.get(name)
+                    out.append(row)
+                docs = out
+            else:
+                raise NotImplementedError(op)
+        docs = docs or []
+        self.db.round_trips += 1 + len(docs) // self.db.batch_size
+        self.db.documents += len(docs)
+        time.sleep(self.db.latency * (1 + len(docs) // self.db.batch_size))
+        return iter(docs)
+
+    def find_one(self, flt=None, projection=None):
+        for d in self.find(flt, projection).limit(1):
+            return d
+        return None
+
+    def count_documents(self, flt):
+        flt = _prepare(flt)
+        return sum(1 for d in self._candidates(flt) if _match(d, flt))
+
+
+class FakeDB:
+    def __init__(self, latency=0.0005, batch_size=1000):
+        self.latency = latency
+        self.batch_size = batch_size
+        self.round_trips = 0
+        self.documents = 0
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self, name)
+        return self._collections[name]
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+class FakeMongo:
+    # Drop-in for flask_pymongo.PyMongo in benchmarks: `app.mongo = FakeMongo(db)`
+    def __init__(self, db):
+        self.db = db
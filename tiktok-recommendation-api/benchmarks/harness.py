@@ -0,0 +1,28 @@
+# Imports app.py against an in-memory Mongo stand-in (no server needed).
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_mongo import FakeDB, FakeMongo  # noqa: E402
+from benchmarks.synthetic import populate  # noqa: E402
+
+
+def load_app(db=None, latency_ms=0.2, **populate_kwargs):
+    os.environ.setdefault("MONGODB_URI", "mongodb://127.0.0.1:27017/benchmark")
+    os.environ.setdefault("LLM_API_KEY", "")
+    os.environ.setdefault("CATALOG_SYNC_INTERVAL", "0")
+    os.environ.setdefault("INTERACTION_POLL_INTERVAL", "0")
+    os.environ.setdefault("ITEM_CF_REFRESH_INTERVAL", "0")
+    os.environ.setdefault("SNAPSHOT_POLL_INTERVAL", "0")
+    import app as appmod
+
+    logging.disable(logging.CRITICAL)
+    users = []
+    if db is None:
+        db = FakeDB(latency=latency_ms / 1000)
+        users, _ = populate(db, **populate_kwargs)
+    appmod.mongo = FakeMongo(db)
+    appmod.ensure_indexes()
+    return appmod, db, users
@@ -0,0 +1,170 @@
+# End-to-end /recommend load test against the in-memory Mongo stand-in and
+# the fake LLM server, reporting throughput and p50/p95/p99 per pipeline
+# stage (the same stages exported on /metrics). Each simulated session
+# opens a new feed and then scrolls through it with cursors.
+#
+#   python -m benchmarks.run_suite [--videos 20000] [--users 200] [--sessions 200]
+#                                  [--output results.json] [--baseline results.json]
+#
+# With --baseline the run fails (exit 1) if any stage's p95 regressed by
+# more than --tolerance, so it can gate a deploy.
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm_server import serve  # noqa: E402
+
+QUANTILES = (50, 95, 99)
+
+
+def summarise(samples):
+    # {series: {"count", "p50", "p95", "p99"}} with latencies in ms
+    summary = {}
+    for key, values in sorted(samples.items()):
+        values = np.array(values) * 1000
+        summary[key] = dict({"count": len(values)},
+                            **{f"p{q}": round(float(np.percentile(values, q)), 3) for q in QUANTILES})
+    return summary
+
+
+def compare(summary, baseline, tolerance, floor_ms):
+    # Series whose p95 got slower than baseline by more than `tolerance`;
+    # differences under `floor_ms` are treated as noise
+    regressions = []
+    for key, before in baseline.get("latency_ms", {}).items():
+        after = summary["latency_ms"].get(key)
+        if after is None:
+            continue
+        if after["p95"] > before["p95"] * (1 + tolerance) and after["p95"] - before["p95"] > floor_ms:
+            regressions.append((key, before["p95"], after["p95"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    data = parser.add_argument_group("synthetic data")
+    data.add_argument("--videos", type=int, default=20000)
+    data.add_argument("--users", type=int, default=200)
+    data.add_argument("--likes-per-user", type=int, default=40)
+    data.add_argument("--views-per-user", type=int, default=120)
+    data.add_argument("--comments-per-video", type=int, default=3)
+    data.add_argument("--seed", type=int, default=7)
+    data.add_argument("--latency-ms", type=float, default=0.5, help="Mongo round trip")
+    llm = parser.add_argument_group("fake LLM server")
+    llm.add_argument("--llm-latency-ms", type=float, default=80)
+    llm.add_argument("--llm-jitter-ms", type=float, default=20)
+    llm.add_argument("--llm-rate-429", type=float, default=0.0)
+    llm.add_argument("--llm-rate-5xx", type=float, default=0.0)
+    load = parser.add_argument_group("load")
+    load.add_argument("--sessions", type=int, default=200)
+    load.add_argument("--scroll-pages", type=int, default=4, help="cursor pages per session after the first")
+    load.add_argument("--limit", type=int, default=10)
+    load.add_argument("--concurrency", type=int, default=4)
+    out = parser.add_argument_group("results")
+    out.add_argument("--output", help="write the summary as JSON")
+    out.add_argument("--baseline", help="summary JSON from a previous run to compare against")
+    out.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown (0.2 = 20%%)")
+    out.add_argument("--floor-ms", type=float, default=1.0, help="ignore p95 differences below this")
+    args = parser.parse_args()
+
+    server, faults, url = serve(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                                rate_429=args.llm_rate_429, rate_5xx=args.llm_rate_5xx)
+    os.environ["LLM_API_URL"] = url
+    os.environ["LLM_API_KEY"] = "benchmark-key"
+    from benchmarks.harness import load_app
+
+    t0 = time.perf_counter()
+    appmod, _, users = load_app(latency_ms=args.latency_ms, n_videos=args.videos, n_users=args.users,
+                                likes_per_user=args.likes_per_user, views_per_user=args.views_per_user,
+                                comments_per_video=args.comments_per_video, seed=args.seed)
+    setup_s = time.perf_counter() - t0
+
+    samples = defaultdict(list)
+    lock = threading.Lock()
+
+    def record(name, value, labels):
+        key = f"stage:{labels['stage']}" if name == "stage_seconds" else f"request:{labels.get('endpoint')}"
+        with lock:
+            samples[key].append(value)
+
+    appmod.metrics.listeners.append(record)
+
+    def session(i):
+        client = appmod.app.test_client()
+        body = {"userId": str(users[i % len(users)]), "limit": args.limit}
+        requests, failures = 0, 0
+        t0 = time.perf_counter()
+        r = client.post("/recommend", json=body)
+        first = time.perf_counter() - t0
+        requests += 1
+        if r.status_code != 200:
+            return requests, 1, first, []
+        cursor = r.get_json()["metadata"]["next_cursor"]
+        scroll = []
+        for _ in range(args.scroll_pages):
+            if not cursor:
+                break
+            t0 = time.perf_counter()
+            r = client.post("/recommend", json=dict(body, cursor=cursor))
+            scroll.append(time.perf_counter() - t0)
+            requests += 1
+            if r.status_code != 200:
+                failures += 1
+                break
+            cursor = r.get_json()["metadata"]["next_cursor"]
+        return requests, failures, first, scroll
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(session, range(args.sessions)))
+    wall = time.perf_counter() - t0
+    server.shutdown()
+
+    total = sum(r[0] for r in results)
+    samples["client:first_page"] = [r[2] for r in results]
+    samples["client:scroll_page"] = [s for r in results for s in r[3]]
+    summary = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "setup_s": round(setup_s, 2),
+        "wall_s": round(wall, 2),
+        "requests": total,
+        "failures": sum(r[1] for r in results),
+        "throughput_rps": round(total / wall, 1),
+        "llm": appmod.recommender.llm.stats(),
+        "latency_ms": summarise(samples)
+    }
+
+    print(f"videos={args.videos} users={args.users} sessions={args.sessions} scroll pages={args.scroll_pages} "
+          f"concurrency={args.concurrency} llm={args.llm_latency_ms}ms (setup {setup_s:.1f}s, cpus={os.cpu_count()})")
+    print(f"requests={total} failures={summary['failures']} wall={wall:.1f}s "
+          f"throughput={summary['throughput_rps']} req/s")
+    print(f"{'series':>26} {'count':>7} " + " ".join(f"{f'p{q}':>9}" for q in QUANTILES))
+    for key, row in summary["latency_ms"].items():
+        print(f"{key:>26} {row['count']:>7} " + " ".join(f"{row[f'p{q}']:>7.2f}ms" for q in QUANTILES))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance, args.floor_ms)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: p95 {before:.2f}ms -> {after:.2f}ms")
+        if regressions:
+            sys.exit(1)
+        print(f"no p95 regressions beyond {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import random
+
+TOPICS = {
+    "cooking": ["pasta", "recipe", "kitchen", "chef", "spicy", "noodles", "baking", "bread", "sauce", "dinner"],
+    "pets": ["cat", "dog", "puppy", "kitten", "cute", "playing", "sleeping", "fluffy", "bark", "meow"],
+    "fitness": ["workout", "gym", "squat", "cardio", "protein", "running", "yoga", "stretch", "abs", "lift"],
+    "travel": ["beach", "mountain", "hotel", "flight", "sunset", "island", "hike", "city", "roadtrip", "camping"],
+    "music": ["guitar", "cover", "song", "beat", "piano", "dance", "remix", "concert", "singing", "drums"],
+    "gaming": ["minecraft", "speedrun", "boss", "level", "stream", "controller", "clutch", "ranked", "loot", "glitch"],
+    "comedy": ["prank", "funny", "skit", "joke", "fail", "reaction", "laugh", "parody", "meme", "awkward"],
+    "tech": ["iphone", "laptop", "unboxing", "review", "gadget", "coding", "python", "setup", "keyboard", "camera"],
+}
+FILLER = ["today", "new", "best", "watch", "trying", "first", "time", "crazy", "amazing", "wait", "end", "part"]
+
+
+def make_caption(rng, topic=None):
+    topic = topic or rng.choice(list(TOPICS))
+    words = rng.sample(TOPICS[topic], 3) + rng.sample(FILLER, 2)
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def make_captions(n, seed=0):
+    rng = random.Random(seed)
+    return [make_caption(rng) for _ in range(n)]
+
+
+def populate(db, n_videos=1000, n_users=200, likes_per_user=20, views_per_user=40,
+             comments_per_video=5, seed=0):
+    # Fill a (fake or real) Mongo database with Videos/Likes/Views/Comments
+    from datetime import datetime, timedelta
+    from bson import ObjectId
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    users = [ObjectId() for _ in range(n_users)]
+    videos = []
+    for i in range(n_videos):
+        videos.append({
+            "_id": ObjectId(),
+            "userId": rng.choice(users),
+            "videoUrl": f"/uploads/{i}.mp4",
+            "thumbnailUrl": f"/uploads/{i}.jpg",
+            "caption": make_caption(rng),
+            "likeCount": 0,
+            "commentCount": comments_per_video,
+            "views": 0,
+            "createdAt": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+            "updatedAt": now,
+        })
+    video_ids = [v["_id"] for v in videos]
+    by_id = {v["_id"]: v for v in videos}
+
+    def interactions(per_user, counter):
+        docs = []
+        for u in users:
+            for vid in rng.sample(video_ids, min(per_user, len(video_ids))):
+                ts = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+                docs.append({"_id": ObjectId(), "userId": u, "videoId": vid, "createdAt": ts, "updatedAt": ts})
+                by_id[vid][counter] += 1
+        return docs
+
+    likes = interactions(likes_per_user, "likeCount")
+    views = interactions(views_per_user, "views")
+    comments = []
+    for vid in video_ids:
+        for _ in range(comments_per_video):
+            comments.append({"_id": ObjectId(), "userId": rng.choice(users), "videoId": vid,
+                             "text": make_caption(rng), "createdAt": now, "updatedAt": now})
+
+    db.Videos.insert_many(videos)
+    db.Likes.insert_many(likes)
+    db.Views.insert_many(views)
+    db.Comments.insert_many(comments)
+    for name, field in (("Likes", "userId"), ("Views", "userId"), ("Comments", "videoId")):
+        if hasattr(db[name], "create_index"):
+            db[name].create_index(field)
+    return users, video_ids
@@ -0,0 +1,41 @@
+# Builder process for multi-worker serving: keeps the catalog indexes and
+# the item CF table current from MongoDB (same settings as app.py) and
+# publishes them as versioned memory-mapped snapshots for the workers:
+#
+#   python build_index.py --output ./data/index [--interval 300] [--keep 3]
+#
+# Workers started with INDEX_SNAPSHOT_DIR=./data/index map the live version
+# read-only and swap to each new one (see gunicorn.conf.py).
+import argparse
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish recommendation index snapshots")
+    parser.add_argument("--output", default=os.environ.get("INDEX_SNAPSHOT_DIR", "./data/index"))
+    parser.add_argument("--interval", type=int, default=300, help="seconds between snapshots (0 = publish once)")
+    parser.add_argument("--keep", type=int, default=3, help="versions kept on disk")
+    args = parser.parse_args()
+
+    # The builder always builds its own indexes, even if the workers' setting is inherited
+    os.environ.pop("INDEX_SNAPSHOT_DIR", None)
+    import app
+    from shared_index import publish
+
+    app.ensure_indexes()
+    while True:
+        try:
+            publish(args.output, app.recommender.caption_index, app.candidate_generator, app.item_cf, keep=args.keep)
+        except Exception as e:
+            logger.error(f"Snapshot publish failed: {e}")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
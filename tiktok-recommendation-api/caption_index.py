@@ -0,0 +1,314 @@
+import os
+import json
+import shutil
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+def _tfidf_vectorizer(**kwargs):
+    # sklearn is imported on first use: workers serving a published snapshot
+    # only need it once they have to vectorise a caption themselves
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(stop_words="english", dtype=np.float32, **kwargs)
+
+
+def video_text(video):
+    caption = (video.get("caption") or "").strip()
+    comments = (video.get("comments_summary") or "").strip()
+    return f"{caption} {comments}".strip()
+
+
+def normalize(vec):
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+class FittedIndex:
+    # A vocabulary/IDF and matrix from prepare_fit(), not yet swapped in
+    def __init__(self, vectorizer, matrix, items, refit):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.items = items
+        self.refit = refit
+
+
+def _replace_dir(src, dst):
+    # Mappings of the old files stay valid after they are unlinked
+    old = f"{dst}.old-{os.getpid()}"
+    if os.path.exists(dst):
+        os.rename(dst, old)
+    try:
+        os.rename(src, dst)
+    except OSError:
+        # Another process swapped its own copy in first; keep that one
+        if not os.path.exists(dst) and os.path.exists(old):
+            os.rename(old, dst)
+        raise
+    finally:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class CaptionIndex:
+    # Long-lived TF-IDF index over video captions (+ comment summaries).
+    # The vocabulary/IDF is fitted once; videos added afterwards are
+    # transformed with the frozen vocabulary and appended as new CSR rows.
+    # Once the index has grown `refit_ratio` past the fitted size it is
+    # flagged (needs_refit); the refit itself is prepared off-lock by the
+    # catalog sync thread and swapped in with commit_fit().
+    # Rows are L2-normalised so a sparse mat-vec against a normalised user
+    # vector gives cosine similarity directly.
+
+    def __init__(self, refit_ratio=0.5, user_cache_size=2048):
+        self.refit_ratio = refit_ratio
+        self.user_cache_size = user_cache_size
+        self.version = 0
+        self._lock = threading.RLock()
+        self._vectorizer = None
+        self._frozen = None
+        self._matrix = None
+        self._pending = []
+        self._row_ids = []
+        self._id_to_row = {}
+        self._texts = {}
+        self._fitted_rows = 0
+        self._refit_due = False
+        self._user_vectors = OrderedDict()
+        # (path, version, rows) of the last save/load, to skip no-op saves
+        self._saved = None
+
+    @property
+    def is_fitted(self):
+        return self._vectorizer is not None or self._frozen is not None
+
+    @property
+    def vectorizer(self):
+        # Loaded indexes keep (vocabulary, idf) until a transform is needed
+        with self._lock:
+            if self._vectorizer is None and self._frozen is not None:
+                vocabulary, idf = self._frozen
+                vectorizer = _tfidf_vectorizer(vocabulary=vocabulary)
+                vectorizer.idf_ = idf
+                self._vectorizer, self._frozen = vectorizer, None
+            return self._vectorizer
+
+    @property
+    def needs_refit(self):
+        return self._refit_due
+
+    def __len__(self):
+        return len(self._id_to_row)
+
+    def __contains__(self, video_id):
+        return video_id in self._id_to_row
+
+    def row_of(self, video_id):
+        return self._id_to_row.get(video_id)
+
+    def video_id_at(self, row):
+        return self._row_ids[row]
+
+    @property
+    def row_ids(self):
+        # Row -> video id. Only appended to until the next fit replaces it,
+        # so a reference taken together with `matrix` stays consistent with it
+        return self._row_ids
+
+    @property
+    def matrix(self):
+        with self._lock:
+            if self._pending:
+                blocks = [self._matrix] if self._matrix is not None else []
+                self._matrix = sparse.vstack(blocks + self._pending, format="csr")
+                self._pending = []
+            return self._matrix
+
+    def fit(self, videos):
+        # videos: iterable of (video_id, text); replaces the whole index
+        fitted = self.prepare_fit(videos)
+        if fitted is not None:
+            self.commit_fit(fitted)
+        return self
+
+    def prepare_fit(self, videos=None):
+        # Fits a vocabulary/IDF and matrix without holding the index lock,
+        # so requests keep being served meanwhile. videos=None refits over
+        # the indexed videos (rows keep their positions). Returns None if
+        # there is no usable text yet.
+        refit = videos is None
+        if refit:
+            with self._lock:
+                videos = [(vid, self._texts[vid]) for vid in self._row_ids]
+        items = [(vid, text) for vid, text in videos]
+        vectorizer = _tfidf_vectorizer()
+        try:
+            matrix = vectorizer.fit_transform([text for _, text in items]).tocsr()
+        except ValueError:
+            # Empty vocabulary (no usable text yet) - stay unfitted
+            logger.warning("Caption index fit skipped: no vocabulary")
+            return None
+        return FittedIndex(vectorizer, matrix, items, refit)
+
+    def commit_fit(self, fitted):
+        with self._lock:
+            items, matrix = list(fitted.items), fitted.matrix
+            if fitted.refit:
+                # Videos indexed while the refit ran, transformed with the new vocabulary
+                late = [(vid, self._texts[vid]) for vid in self._row_ids[len(items):]]
+                if late:
+                    rows = fitted.vectorizer.transform([text for _, text in late]).tocsr()
+                    matrix = sparse.vstack([matrix, rows], format="csr")
+                    items += late
+            self._vectorizer, self._frozen = fitted.vectorizer, None
+            self._matrix = matrix
+            self._pending = []
+            self._row_ids = [vid for vid, _ in items]
+            self._id_to_row = {vid: i for i, vid in enumerate(self._row_ids)}
+            self._texts = {vid: text for vid, text in items}
+            self._fitted_rows = len(fitted.items)
+            self._refit_due = False
+            self._user_vectors.clear()
+            self.version += 1
+            logger.info(f"Caption index fitted: {len(items)} videos, {len(fitted.vectorizer.vocabulary_)} terms")
+
+    def add(self, videos):
+        # Incremental update; returns the number of rows appended. The
+        # unlocked filter is only a fast path; concurrent callers adding the
+        # same video are de-duplicated again under the lock.
+        videos = list(videos)
+        if not any(vid not in self._id_to_row for vid, _ in videos):
+            return 0
+        with self._lock:
+            items = list({vid: text for vid, text in videos if vid not in self._id_to_row}.items())
+            if not items:
+                return 0
+            if not self.is_fitted:
+                self._texts.update(items)
+                self.fit(list(self._texts.items()))
+                return len(items)
+            rows = self.vectorizer.transform([text for _, text in items]).tocsr()
+            self._pending.append(rows)
+            for vid, text in items:
+                self._id_to_row[vid] = len(self._row_ids)
+                self._row_ids.append(vid)
+                self._texts[vid] = text
+            if len(self._row_ids) - self._fitted_rows > self.refit_ratio * max(self._fitted_rows, 1):
+                # Vocabulary has drifted too far from the fitted IDF
+                self._refit_due = True
+        return len(items)
+
+    def mean_vector(self, liked_ids):
+        # Unnormalised mean of the liked rows and how many rows it covers
+        rows = sorted({self._id_to_row[v] for v in liked_ids if v in self._id_to_row})
+        if not rows:
+            return None, 0
+        return np.asarray(self.matrix[rows].mean(axis=0), dtype=np.float32).ravel(), len(rows)
+
+    def row_vector(self, video_id):
+        row = self._id_to_row.get(video_id)
+        if row is None:
+            return None
+        return np.asarray(self.matrix[row].toarray(), dtype=np.float32).ravel()
+
+    def user_vector(self, liked_ids, cache=True):
+        # cache=False for callers that memoise the vector themselves
+        rows = sorted({self._id_to_row[v] for v in liked_ids if v in self._id_to_row})
+        if not rows:
+            return None
+        key = (self.version, tuple(rows))
+        with self._lock:
+            cached = self._user_vectors.get(key) if cache else None
+            if cached is not None:
+                self._user_vectors.move_to_end(key)
+                return cached
+        vec = normalize(np.asarray(self.matrix[rows].mean(axis=0), dtype=np.float32).ravel())
+        if cache:
+            with self._lock:
+                self._user_vectors[key] = vec
+                if len(self._user_vectors) > self.user_cache_size:
+                    self._user_vectors.popitem(last=False)
+        return vec
+
+    def score(self, user_vec, video_ids):
+        # Cosine similarity of user_vec against the given videos (0.0 when unindexed)
+        scores = np.zeros(len(video_ids), dtype=np.float32)
+        if user_vec is None or not self.is_fitted:
+            return scores
+        positions = [i for i, v in enumerate(video_ids) if v in self._id_to_row]
+        if positions:
+            rows = [self._id_to_row[video_ids[i]] for i in positions]
+            scores[positions] = self.matrix[rows] @ user_vec
+        return scores
+
+    def save(self, path):
+        # The files at `path` may be memory-mapped by this or another
+        # process, so they are never rewritten in place: the snapshot is
+        # written to a sibling directory and renamed over the old one.
+        # Returns False when nothing changed since the last save/load.
+        path = os.path.abspath(path)
+        with self._lock:
+            if not self.is_fitted:
+                raise ValueError("Cannot save an unfitted caption index")
+            state = (path, self.version, len(self._row_ids))
+            if self._saved == state:
+                return False
+            matrix = self.matrix
+            vectorizer = self.vectorizer
+            tmp = f"{path}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            try:
+                np.save(os.path.join(tmp, "data.npy"), matrix.data)
+                np.save(os.path.join(tmp, "indices.npy"), matrix.indices)
+                np.save(os.path.join(tmp, "indptr.npy"), matrix.indptr)
+                np.save(os.path.join(tmp, "idf.npy"), vectorizer.idf_.astype(np.float32))
+                with open(os.path.join(tmp, "meta.json"), "w") as f:
+                    json.dump({
+                        "vocabulary": {t: int(i) for t, i in vectorizer.vocabulary_.items()},
+                        "row_ids": [str(v) for v in self._row_ids],
+                        "fitted_rows": self._fitted_rows,
+                        "shape": list(matrix.shape),
+                    }, f)
+                with open(os.path.join(tmp, "texts.json"), "w") as f:
+                    json.dump([self._texts.get(v, "") for v in self._row_ids], f)
+                _replace_dir(tmp, path)
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            self._saved = state
+        logger.info(f"Caption index saved to {path}")
+        return True
+
+    @classmethod
+    def load(cls, path, id_parser=None, mmap=True, version=1, **kwargs):
+        # Arrays are memory-mapped read-only; appended rows live in memory.
+        # `version` must differ between snapshots swapped into one process.
+        index = cls(**kwargs)
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(path, "data.npy"), mmap_mode=mode)
+        indices = np.load(os.path.join(path, "indices.npy"), mmap_mode=mode)
+        indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode=mode)
+        idf = np.load(os.path.join(path, "idf.npy"))
+
+        index._frozen = (meta["vocabulary"], idf)
+        index._matrix = sparse.csr_matrix((data, indices, indptr), shape=tuple(meta["shape"]), copy=False)
+
+        parse = id_parser or (lambda s: s)
+        index._row_ids = [parse(v) for v in meta["row_ids"]]
+        index._id_to_row = {vid: i for i, vid in enumerate(index._row_ids)}
+        index._fitted_rows = meta.get("fitted_rows", len(index._row_ids))
+        texts_path = os.path.join(path, "texts.json")
+        if os.path.exists(texts_path):
+            with open(texts_path) as f:
+                index._texts = dict(zip(index._row_ids, json.load(f)))
+        index.version = version
+        index._saved = (os.path.abspath(path), version, len(index._row_ids))
+        logger.info(f"Caption index loaded from {path}: {len(index._row_ids)} videos")
+        return index
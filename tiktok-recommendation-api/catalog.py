@@ -0,0 +1,124 @@
+import time
+import threading
+import logging
+from datetime import datetime, timezone
+
+from caption_index import video_text
+
+logger = logging.getLogger(__name__)
+
+SYNC_PROJECTION = {"caption": 1, "createdAt": 1, "likeCount": 1, "views": 1}
+
+
+def timestamp(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return 0.0
+
+
+class CatalogSync:
+    # Keeps the caption index and candidate generator in step with Videos:
+    # new uploads are pulled by a createdAt watermark every `interval`
+    # seconds and like/view counts are rescanned every `stats_interval`.
+
+    def __init__(self, get_db, caption_index, candidates, comment_summaries,
+                 interval=30, stats_interval=300, batch_size=1000):
+        self.get_db = get_db
+        self.caption_index = caption_index
+        self.candidates = candidates
+        self.comment_summaries = comment_summaries
+        self.interval = interval
+        self.stats_interval = stats_interval
+        self.batch_size = batch_size
+        self.ready = False
+        self._watermark = None
+        self._last_stats = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _texts(self, batch):
+        db = self.get_db()
+        new = [v for v in batch if v["_id"] not in self.caption_index]
+        if not new:
+            return []
+        summaries = self.comment_summaries.get_many(db.Comments, [v["_id"] for v in new])
+        return [(v["_id"], video_text({"caption": v.get("caption"), "comments_summary": summaries.get(v["_id"])}))
+                for v in new]
+
+    def sync(self):
+        # Pull videos created since the last sync; returns the number indexed
+        with self._lock:
+            db = self.get_db()
+            query = {} if self._watermark is None else {"createdAt": {"$gte": self._watermark}}
+            # An empty index is fitted once over the whole scan instead of
+            # growing (and refitting) batch by batch
+            bulk = not self.caption_index.is_fitted
+            docs, stats = [], []
+            added = 0
+            batch = []
+            for v in db.Videos.find(query, SYNC_PROJECTION).sort("createdAt", 1):
+                batch.append(v)
+                if v.get("createdAt") and (self._watermark is None or v["createdAt"] > self._watermark):
+                    self._watermark = v["createdAt"]
+                if len(batch) >= self.batch_size:
+                    added += self._flush(batch, bulk, docs, stats)
+                    batch = []
+            added += self._flush(batch, bulk, docs, stats)
+            if bulk and docs:
+                self.caption_index.fit(docs)
+                added = len(self.caption_index)
+            if stats:
+                self.candidates.update_stats(stats)
+            if self.caption_index.needs_refit:
+                # Built off-lock here and swapped in; requests are not blocked
+                self.candidates.refit()
+            if not self.ready:
+                self._last_stats = time.time()
+            self.ready = True
+            if added:
+                logger.info(f"Catalog sync indexed {added} new videos ({len(self.caption_index)} total)")
+            return added
+
+    def _flush(self, batch, bulk, docs, stats):
+        texts = self._texts(batch)
+        stats.extend((v["_id"], timestamp(v.get("createdAt")), v.get("likeCount", 0) or 0, v.get("views", 0) or 0)
+                     for v in batch)
+        if bulk:
+            docs.extend(texts)
+            return 0
+        return self.caption_index.add(texts)
+
+    def refresh_stats(self):
+        with self._lock:
+            db = self.get_db()
+            batch = []
+            for v in db.Videos.find({}, {"createdAt": 1, "likeCount": 1, "views": 1}):
+                batch.append((v["_id"], timestamp(v.get("createdAt")), v.get("likeCount", 0) or 0, v.get("views", 0) or 0))
+                if len(batch) >= self.batch_size:
+                    self.candidates.update_stats(batch)
+                    batch = []
+            if batch:
+                self.candidates.update_stats(batch)
+            self._last_stats = time.time()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sync()
+                if time.time() - self._last_stats >= self.stats_interval:
+                    self.refresh_stats()
+            except Exception as e:
+                logger.error(f"Catalog sync failed: {e}")
+
+    def ensure_ready(self):
+        # First caller builds the catalog synchronously, then a daemon keeps it fresh
+        if not self.ready:
+            self.sync()
+        if self._thread is None and self.interval > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="catalog-sync", daemon=True)
+                    self._thread.start()
@@ -0,0 +1,107 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# "unknown group operator" - the server predates $firstN
+UNKNOWN_GROUP_OPERATOR = 15952
+
+
+class CommentSummaryCache:
+    # videoId -> "comment comment comment" summary, built from the first
+    # `per_video` comments of each video. Misses are fetched with a single
+    # aggregation for the whole page instead of one query per video; only
+    # `per_video` comments per video leave the server.
+
+    def __init__(self, maxsize=50000, ttl=600, per_video=3, max_chars=200):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.per_video = per_video
+        self.max_chars = max_chars
+        # $firstN needs MongoDB 5.2+; older servers get $push + $slice
+        self.first_n = True
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _get(self, video_id, now):
+        entry = self._entries.get(video_id)
+        if entry is None:
+            return None
+        summary, stored_at = entry
+        if now - stored_at > self.ttl:
+            del self._entries[video_id]
+            return None
+        self._entries.move_to_end(video_id)
+        return summary
+
+    def _put(self, video_id, summary, now):
+        self._entries[video_id] = (summary, now)
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_many(self, comments_collection, video_ids):
+        now = time.time()
+        result = {}
+        missing = []
+        with self._lock:
+            for vid in video_ids:
+                summary = self._get(vid, now)
+                if summary is None:
+                    missing.append(vid)
+                else:
+                    result[vid] = summary
+            self.hits += len(result)
+            self.misses += len(missing)
+
+        if missing:
+            texts = {vid: [] for vid in missing}
+            for group in self._first_comments(comments_collection, missing):
+                if group["_id"] in texts:
+                    texts[group["_id"]] = [(t or "").strip() for t in group["texts"][:self.per_video]]
+            with self._lock:
+                for vid, parts in texts.items():
+                    summary = " ".join(parts)[:self.max_chars]
+                    self._put(vid, summary, now)
+                    result[vid] = summary
+        return result
+
+    def _pipeline(self, video_ids):
+        if self.first_n:
+            texts = {"$firstN": {"input": "$text", "n": self.per_video}}
+            return [{"$match": {"videoId": {"$in": video_ids}}},
+                    {"$group": {"_id": "$videoId", "texts": texts}}]
+        return [{"$match": {"videoId": {"$in": video_ids}}},
+                {"$group": {"_id": "$videoId", "texts": {"$push": "$text"}}},
+                {"$project": {"texts": {"$slice": ["$texts", self.per_video]}}}]
+
+    def _first_comments(self, comments_collection, video_ids):
+        # [{"_id": videoId, "texts": [...]}] with at most `per_video` texts each
+        try:
+            return list(comments_collection.aggregate(self._pipeline(video_ids)))
+        except OperationFailure as e:
+            # Only an old server downgrades for good; timeouts, stepdowns
+            # and other failures propagate and the next miss tries again
+            if not self.first_n or (e.code != UNKNOWN_GROUP_OPERATOR and "$firstN" not in str(e)):
+                raise
+            logger.warning(f"$firstN unavailable ({e}) - using $push/$slice for comment summaries")
+            self.first_n = False
+            return list(comments_collection.aggregate(self._pipeline(video_ids)))
+
+    def invalidate(self, video_id):
+        with self._lock:
+            return self._entries.pop(video_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
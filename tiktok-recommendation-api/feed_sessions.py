@@ -0,0 +1,150 @@
+import re
+import time
+import base64
+import secrets
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# secrets.token_urlsafe(12); cursors are client input and name backend files
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]{16}")
+
+
+def encode_cursor(session_id, offset):
+    return base64.urlsafe_b64encode(f"{session_id}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    # (session_id, offset), or None for anything malformed
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        session_id, offset = raw.rsplit(":", 1)
+        return session_id, int(offset)
+    except Exception:
+        return None
+
+
+class FeedSession:
+    __slots__ = ("user_id", "video_ids", "items", "metadata", "created_at")
+
+    def __init__(self, user_id, video_ids, items, metadata, created_at=None):
+        self.user_id = user_id
+        self.video_ids = video_ids
+        self.items = items
+        self.metadata = metadata
+        self.created_at = time.time() if created_at is None else created_at
+
+
+class FeedSessionStore:
+    # Bounded LRU/TTL store of ranked feeds. /recommend ranks a long list
+    # once per session and later pages are sliced from it; the cursor
+    # encodes the session and the offset of the next unread item.
+    #
+    # With a `backend` (FileRankingBackend), sessions are also written there
+    # so that a cursor can be served by any worker process; ids are stored
+    # as strings and turned back into ids by `id_parser`.
+
+    def __init__(self, maxsize=10000, ttl=1800, backend=None, id_parser=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.id_parser = id_parser or (lambda value: value)
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self.counters = {"created": 0, "pages": 0, "expired": 0, "filtered": 0, "backend_hits": 0}
+
+    def _remember(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+
+    def create(self, user_id, video_ids, items, metadata=None):
+        session_id = secrets.token_urlsafe(12)
+        session = FeedSession(user_id, list(video_ids), list(items), metadata or {})
+        if self.backend is not None:
+            self.backend.put(session_id, {
+                "user_id": str(user_id),
+                "video_ids": [str(v) for v in session.video_ids],
+                "items": session.items,
+                "metadata": session.metadata
+            }, session.created_at)
+        self._remember(session_id, session)
+        with self._lock:
+            self.counters["created"] += 1
+        return session_id
+
+    def _load(self, session_id):
+        # Session created by another worker, or None
+        if self.backend is None or not SESSION_ID.fullmatch(session_id):
+            return None
+        entry = self.backend.get(session_id)
+        if entry is None:
+            return None
+        value, created_at = entry
+        try:
+            session = FeedSession(self.id_parser(value["user_id"]), [self.id_parser(v) for v in value["video_ids"]],
+                                  value["items"], value["metadata"], created_at)
+        except Exception as e:
+            logger.warning(f"Unreadable feed session {session_id}: {e}")
+            return None
+        self._remember(session_id, session)
+        with self._lock:
+            self.counters["backend_hits"] += 1
+        return session
+
+    def _get(self, session_id, user_id):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            session = self._load(session_id)
+        with self._lock:
+            if session is None:
+                self.counters["expired"] += 1
+                return None
+            if now - session.created_at > self.ttl:
+                self._sessions.pop(session_id, None)
+                self.counters["expired"] += 1
+                return None
+            if session.user_id != user_id:
+                return None
+            if session_id in self._sessions:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def page(self, session_id, offset, user_id, limit, seen_mask=None):
+        # Returns (items, next_offset or None when exhausted, session metadata),
+        # or None if the session is unknown, expired or belongs to another
+        # user. seen_mask(video_ids) -> bool array drops items seen since
+        # the list was ranked.
+        session = self._get(session_id, user_id)
+        if session is None:
+            return None
+        items, filtered = [], 0
+        limit = max(limit, 1)
+        position = max(offset, 0)
+        total = len(session.items)
+        while len(items) < limit and position < total:
+            end = min(position + 2 * (limit - len(items)), total)
+            window = range(position, end)
+            seen = seen_mask(session.video_ids[position:end]) if seen_mask is not None else None
+            for i in window:
+                if seen is not None and seen[i - position]:
+                    filtered += 1
+                    continue
+                if len(items) == limit:
+                    end = i
+                    break
+                items.append(session.items[i])
+            position = end
+        with self._lock:
+            self.counters["pages"] += 1
+            self.counters["filtered"] += filtered
+        return items, (position if position < total else None), session.metadata
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, size=len(self._sessions))
@@ -0,0 +1,49 @@
+# Multi-worker serving: run build_index.py once (or as a service) to publish
+# snapshots, then
+#
+#   INDEX_SNAPSHOT_DIR=./data/index gunicorn app:app
+#
+# Every worker maps the same snapshot files read-only, so the catalog
+# indexes are held once in the page cache rather than once per worker.
+#
+# Each worker is a separate process with its own caches. What is shared:
+#   - feed sessions: written to FEED_SESSION_DIR, so a cursor works on any
+#     worker (the directory must be shared by every worker behind the port)
+#   - profile events and comment invalidations: the receiving worker applies
+#     them and publishes them to the RecommenderEvents collection; siblings
+#     apply them within WORKER_EVENT_POLL_INTERVAL seconds
+#   - /metrics histograms: flushed to METRICS_DIR, and whichever worker
+#     answers a scrape sums every worker's file (siblings may lag by up to
+#     METRICS_FLUSH_SECONDS)
+#   - LLM rankings only with RANKING_CACHE_DIR set
+# What is not: profile, comment summary and item CF caches are held once
+# per worker (memory grows with WEB_CONCURRENCY, and each worker loads a
+# user's profile on first sight), and every worker has its own LLM circuit
+# breaker. A worker that misses an event (Mongo down while publishing)
+# catches up when the affected profile or summary reaches its TTL.
+import os
+import shutil
+
+os.environ.setdefault("METRICS_DIR", os.path.join("data", "metrics"))
+os.environ.setdefault("FEED_SESSION_DIR", os.path.join("data", "feed_sessions"))
+os.environ.setdefault("WORKER_EVENTS_ENABLED", "True")
+
+bind = f"0.0.0.0:{os.environ.get('RECOMMENDATION_API_PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = 30
+# Not preloaded: the snapshot watcher thread has to start in each worker
+preload_app = False
+
+
+def on_starting(server):
+    # Worker files from a previous run would be summed into this one
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def post_worker_init(worker):
+    import app
+
+    # Workers only read CAPTION_INDEX_PATH; writing it from every worker
+    # would replace files that sibling workers are mapping
+    app.warm_catalog(save=False)
@@ -0,0 +1,347 @@
+import time
+import threading
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+
+from user_profiles import ItemIdMap
+
+logger = logging.getLogger(__name__)
+
+PAIR_PROJECTION = {"userId": 1, "videoId": 1, "_id": 0}
+
+
+def _keys(users, items):
+    # (user, item) pairs packed into sortable int64 keys
+    return (np.asarray(users, dtype=np.int64) << 32) | np.asarray(items, dtype=np.int64)
+
+
+def _sorted_unique(keys):
+    keys = np.sort(keys)
+    if len(keys):
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return keys
+
+
+class ItemNeighbours:
+    # Top-N item-item cosine similarities over the user x item interaction
+    # matrix (likes weighted above views). The neighbour table is two dense
+    # (items x N) arrays, nbr_idx (-1 padded) and nbr_sim, indexed by the
+    # same item ids as the user profiles, so serving a user is a gather over
+    # their items' rows. Events mark the item and user dirty; refresh()
+    # recomputes only the rows they can affect and rebuild() recomputes
+    # everything.
+
+    def __init__(self, item_ids=None, n_neighbours=50, like_weight=1.0, view_weight=0.3,
+                 max_user_items=1000, block_size=4096):
+        self.item_ids = item_ids if item_ids is not None else ItemIdMap()
+        self.user_ids = ItemIdMap()
+        self.n_neighbours = n_neighbours
+        self.like_weight = like_weight
+        self.view_weight = view_weight
+        self.max_user_items = max_user_items
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._likes = np.empty(0, dtype=np.int64)
+        self._views = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._dirty = set()
+        self._dirty_users = set()
+        self._table = (np.full((0, n_neighbours), -1, dtype=np.int32), np.zeros((0, n_neighbours), dtype=np.float32))
+        self.version = 0
+        self.built_at = 0.0
+        self.read_only = False
+
+    def __len__(self):
+        return len(self._table[0])
+
+    @property
+    def nbytes(self):
+        idx, sim = self._table
+        return idx.nbytes + sim.nbytes + self._likes.nbytes + self._views.nbytes
+
+    def load(self, likes, views):
+        # likes/views: iterables of (userId, videoId); replaces all interactions
+        likes, views = list(likes), list(views)
+        like_keys = self._pair_keys(likes)
+        view_keys = self._pair_keys(views)
+        with self._lock:
+            self._likes = _sorted_unique(like_keys)
+            self._views = _sorted_unique(view_keys)
+            self._pending = []
+        return self.rebuild()
+
+    def _pair_keys(self, pairs):
+        if not pairs:
+            return np.empty(0, dtype=np.int64)
+        users = self.user_ids.assign([p[0] for p in pairs])
+        return _keys(users, self.item_ids.assign([p[1] for p in pairs]))
+
+    def attach(self, item_ids, nbr_idx, nbr_sim, built_at=0.0):
+        # Serve a neighbour table built elsewhere (a published snapshot).
+        # Interactions are not kept, so events are ignored until the next one.
+        with self._build_lock, self._lock:
+            self.item_ids = item_ids
+            self._likes = np.empty(0, dtype=np.int64)
+            self._views = np.empty(0, dtype=np.int64)
+            self._pending = []
+            self._dirty = set()
+            self._dirty_users = set()
+            self._table = (nbr_idx, nbr_sim)
+            self.version += 1
+            self.built_at = built_at
+            self.read_only = True
+
+    def table(self):
+        return self._table
+
+    def apply(self, event_type, user_id, video_id):
+        if self.read_only:
+            return
+        user = self.user_ids.assign([user_id])[0]
+        item = self.item_ids.assign([video_id])[0]
+        kind = {"like": "like", "dislike": "unlike", "view": "view"}.get(event_type)
+        if kind is None:
+            raise ValueError(f"Unknown interaction event: {event_type}")
+        with self._lock:
+            self._pending.append((kind, int(_keys([user], [item])[0])))
+            self._dirty.add(int(item))
+            self._dirty_users.add(int(user))
+
+    def _merge(self):
+        # Events are applied in arrival order: the last like/unlike of a
+        # (user, item) pair wins
+        with self._lock:
+            pending, self._pending = self._pending, []
+            latest, views = {}, []
+            for kind, key in pending:
+                if kind == "view":
+                    views.append(key)
+                else:
+                    latest[key] = kind
+            liked = [key for key, kind in latest.items() if kind == "like"]
+            unliked = [key for key, kind in latest.items() if kind == "unlike"]
+            if liked:
+                self._likes = np.union1d(self._likes, np.asarray(liked, dtype=np.int64))
+            if unliked:
+                self._likes = np.setdiff1d(self._likes, np.asarray(unliked, dtype=np.int64), assume_unique=True)
+            if views:
+                self._views = np.union1d(self._views, np.asarray(views, dtype=np.int64))
+            return self._likes, self._views
+
+    def _matrix(self, likes, views):
+        keys = _sorted_unique(np.concatenate([likes, views]))
+        users = (keys >> 32).astype(np.int64)
+        items = (keys & 0xFFFFFFFF).astype(np.int64)
+        liked = np.isin(keys, likes, assume_unique=True)
+        weights = np.where(liked, self.like_weight, self.view_weight).astype(np.float32)
+
+        # Heavy users dominate co-occurrence cost (and add little signal),
+        # so keep at most max_user_items per user, likes first
+        counts = np.bincount(users, minlength=len(self.user_ids))
+        if len(counts) and counts.max() > self.max_user_items:
+            order = np.lexsort((~liked, users))
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            position = np.arange(len(order)) - starts[users[order]]
+            keep = order[position < self.max_user_items]
+            users, items, weights = users[keep], items[keep], weights[keep]
+
+        shape = (len(self.user_ids), len(self.item_ids))
+        matrix = sp.csr_matrix((weights, (users, items)), shape=shape, dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0), dtype=np.float32).ravel())
+        return matrix, norms
+
+    def _affected(self, matrix, likes, views, dirty, dirty_users):
+        # Rows whose top-N can change after the pending events: the touched
+        # items, every other item of the users who touched them (their
+        # co-occurrence with the touched item changed) and every item
+        # co-occurring with a touched item (its norm changed). A user over
+        # max_user_items can also push items out of the capped matrix, so
+        # all of that user's items count as touched.
+        keys = _sorted_unique(np.concatenate([likes, views]))
+        users = keys >> 32
+        items = keys & 0xFFFFFFFF
+        dirty_users = np.fromiter(dirty_users, dtype=np.int64, count=len(dirty_users))
+        of_users = np.isin(users, dirty_users)
+        counts = np.bincount(users[of_users], minlength=len(self.user_ids))
+        heavy = of_users & (counts[users] > self.max_user_items)
+        touched = np.union1d(np.fromiter(dirty, dtype=np.int64, count=len(dirty)), items[heavy])
+        touched = touched[touched < matrix.shape[1]]
+        co_users = np.union1d(matrix.tocsc()[:, touched].indices, dirty_users)
+        co_items = matrix[co_users[co_users < matrix.shape[0]]].indices
+        return np.union1d(np.union1d(touched, items[of_users]), co_items).astype(np.int64)
+
+    def _neighbours(self, matrix, norms, items):
+        # Top-N rows for `items`, computed in blocks to bound the size of
+        # the intermediate co-occurrence product
+        n = self.n_neighbours
+        idx = np.full((len(items), n), -1, dtype=np.int32)
+        sim = np.zeros((len(items), n), dtype=np.float32)
+        if not len(items) or not matrix.nnz:
+            return idx, sim
+        columns = matrix.T.tocsr()
+        inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        for start in range(0, len(items), self.block_size):
+            block = items[start:start + self.block_size]
+            co = (columns[block] @ matrix).tocoo()
+            rows, cols = co.row, co.col
+            values = co.data * inv[block][rows] * inv[cols]
+            keep = cols != block[rows]
+            rows, cols, values = rows[keep], cols[keep], values[keep]
+            order = np.lexsort((-values, rows))
+            rows, cols, values = rows[order], cols[order], values[order]
+            starts = np.searchsorted(rows, np.arange(len(block)))
+            rank = np.arange(len(rows)) - starts[rows]
+            top = rank < n
+            idx[start + rows[top], rank[top]] = cols[top]
+            sim[start + rows[top], rank[top]] = values[top]
+        return idx, sim
+
+    def rebuild(self):
+        with self._build_lock:
+            with self._lock:
+                self._dirty.clear()
+                self._dirty_users.clear()
+            likes, views = self._merge()
+            t0 = time.time()
+            matrix, norms = self._matrix(likes, views)
+            items = np.arange(matrix.shape[1], dtype=np.int64)
+            table = self._neighbours(matrix, norms, items)
+            with self._lock:
+                self._table = table
+                self.version += 1
+                self.built_at = time.time()
+            logger.info(f"Item CF built for {len(items)} items from {matrix.nnz} interactions "
+                        f"in {time.time() - t0:.1f}s")
+            return len(items)
+
+    def refresh(self):
+        # Recompute the neighbour rows affected by events since the last
+        # refresh. Touching a popular item reaches many rows, up to a rebuild.
+        with self._build_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                dirty_users, self._dirty_users = self._dirty_users, set()
+            if not dirty:
+                return 0
+            likes, views = self._merge()
+            matrix, norms = self._matrix(likes, views)
+            items = self._affected(matrix, likes, views, dirty, dirty_users)
+            idx, sim = self._neighbours(matrix, norms, items)
+            with self._lock:
+                table_idx, table_sim = self._table
+                size = matrix.shape[1]
+                if len(table_idx) < size:
+                    grow = size - len(table_idx)
+                    table_idx = np.vstack([table_idx, np.full((grow, self.n_neighbours), -1, dtype=np.int32)])
+                    table_sim = np.vstack([table_sim, np.zeros((grow, self.n_neighbours), dtype=np.float32)])
+                table_idx[items] = idx
+                table_sim[items] = sim
+                self._table = (table_idx, table_sim)
+                self.version += 1
+            return len(items)
+
+    def _gather(self, liked, viewed):
+        # Neighbour lists of the user's items, flattened; views count less
+        idx, sim = self._table
+        liked = np.asarray(liked, dtype=np.int64)
+        viewed = np.setdiff1d(np.asarray(viewed, dtype=np.int64), liked)
+        liked, viewed = liked[liked < len(idx)], viewed[viewed < len(idx)]
+        ratio = self.view_weight / self.like_weight if self.like_weight else 1.0
+        nbrs = np.concatenate([idx[liked].ravel(), idx[viewed].ravel()])
+        sims = np.concatenate([sim[liked].ravel(), ratio * sim[viewed].ravel()])
+        valid = nbrs >= 0
+        return nbrs[valid], sims[valid]
+
+    def score(self, liked, viewed, items):
+        # Summed similarity of each item in `items` to the user's items
+        items = np.asarray(items, dtype=np.int64)
+        scores = np.zeros(len(items), dtype=np.float32)
+        nbrs, sims = self._gather(liked, viewed)
+        if not len(nbrs) or not len(items):
+            return scores
+        order = np.argsort(items)
+        sorted_items = items[order]
+        pos = np.searchsorted(sorted_items, nbrs)
+        pos[pos >= len(items)] = 0
+        hit = sorted_items[pos] == nbrs
+        scores[order] = np.bincount(pos[hit], weights=sims[hit], minlength=len(items))
+        return scores
+
+    def recommend(self, liked, viewed, k, exclude=None):
+        # Top-k items by merged neighbour lists, skipping `exclude` (seen items)
+        nbrs, sims = self._gather(liked, viewed)
+        if not len(nbrs):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        items, inverse = np.unique(nbrs, return_inverse=True)
+        scores = np.bincount(inverse, weights=sims).astype(np.float32)
+        if exclude is not None and len(exclude):
+            keep = ~np.isin(items, exclude)
+            items, scores = items[keep], scores[keep]
+        k = min(k, len(items))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return items[top], scores[top]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._table[0]),
+                "users": len(self.user_ids),
+                "likes": len(self._likes),
+                "views": len(self._views),
+                "dirty": len(self._dirty),
+                "bytes": self.nbytes,
+                "version": self.version,
+                "built_at": self.built_at
+            }
+
+
+class ItemCFSync:
+    # Loads Likes/Views into the item CF model, then refreshes dirty
+    # neighbour rows every `interval` seconds and reloads everything from
+    # MongoDB every `rebuild_interval` (the backstop for missed events).
+
+    def __init__(self, get_db, model, interval=60, rebuild_interval=3600):
+        self.get_db = get_db
+        self.model = model
+        self.interval = interval
+        self.rebuild_interval = rebuild_interval
+        self.ready = False
+        self._last_load = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def load(self):
+        db = self.get_db()
+        likes = [(d["userId"], d["videoId"]) for d in db.Likes.find({}, PAIR_PROJECTION)
+                 if "userId" in d and "videoId" in d]
+        views = [(d["userId"], d["videoId"]) for d in db.Views.find({}, PAIR_PROJECTION)
+                 if "userId" in d and "videoId" in d]
+        self.model.load(likes, views)
+        self._last_load = time.time()
+        self.ready = True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if time.time() - self._last_load >= self.rebuild_interval:
+                    self.load()
+                else:
+                    self.model.refresh()
+            except Exception as e:
+                logger.error(f"Item CF refresh failed: {e}")
+
+    def ensure_ready(self):
+        # First caller loads synchronously, then a daemon keeps it fresh
+        with self._lock:
+            if not self.ready:
+                self.load()
+            if self._thread is None and self.interval > 0:
+                self._thread = threading.Thread(target=self._run, name="item-cf-sync", daemon=True)
+                self._thread.start()
@@ -0,0 +1,173 @@
+import time
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` consecutive failures (or a 429
+    # with Retry-After); open -> half_open after `reset_timeout`; a single
+    # trial call (one attempt, no retries) in half_open closes or re-opens it.
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._open_for = reset_timeout
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self._open_for:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, open_for=None):
+        with self._lock:
+            self._failures += 1
+            was_trial = self._trial_running
+            self._trial_running = False
+            if open_for is not None or was_trial or self._failures >= self.failure_threshold:
+                if self._opened_at is None or was_trial:
+                    logger.warning(f"LLM circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                self._open_for = max(open_for or 0, self.reset_timeout)
+
+
+class LLMClient:
+    # Pooled keep-alive client with an end-to-end deadline per call.
+    # Attempts and jittered backoff run on a small thread pool so the
+    # calling (Flask) thread waits at most `deadline` seconds.
+
+    def __init__(self, api_url, api_key, deadline=0.8, max_retries=3, backoff=0.05, max_backoff=0.5,
+                 pool_size=32, breaker=None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "success": 0, "failure": 0, "timeout": 0, "short_circuit": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, breaker=self.breaker.state)
+
+    def _sleep_before_retry(self, attempt, deadline_at, retry_after=None):
+        # Full jitter; returns False when the wait would overrun the deadline
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if time.monotonic() + delay >= deadline_at:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _attempts(self, payload, deadline_at):
+        for attempt in range(self.max_retries):
+            if attempt and self.breaker.state != "closed":
+                # The last failure opened the circuit (or failed the single
+                # half-open trial): stop instead of hammering the provider
+                break
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                # Also releases a half-open trial that never got to run
+                self.breaker.record_failure()
+                break
+            retry_after = None
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=remaining)
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    return response.json()
+                if response.status_code == 429:
+                    retry_after = _retry_after(response)
+                    logger.warning(f"LLM rate limited (retry after {retry_after})")
+                    if retry_after is not None and time.monotonic() + retry_after >= deadline_at:
+                        self.breaker.record_failure(open_for=retry_after)
+                        return None
+                elif response.status_code < 500:
+                    logger.error(f"API Error {response.status_code}: {response.text[:200]}")
+                    self.breaker.record_failure()
+                    return None
+                else:
+                    logger.error(f"API Error {response.status_code}")
+            except requests.RequestException as e:
+                logger.error(f"LLM call failed: {e}")
+            self.breaker.record_failure()
+            if not self._sleep_before_retry(attempt, deadline_at, retry_after):
+                break
+        return None
+
+    def generate(self, payload, deadline=None):
+        # JSON response of the provider, or None on failure/timeout/open circuit
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("short_circuit")
+            return None
+        deadline = self.deadline if deadline is None else deadline
+        deadline_at = time.monotonic() + deadline
+        future = self._executor.submit(self._attempts, payload, deadline_at)
+        try:
+            result = future.result(timeout=deadline)
+        except FutureTimeout:
+            self._count("timeout")
+            logger.warning(f"LLM deadline of {deadline * 1000:.0f} ms exceeded")
+            return None
+        except Exception as e:
+            logger.error(f"LLM call failed: {e}")
+            result = None
+        self._count("success" if result is not None else "failure")
+        return result
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
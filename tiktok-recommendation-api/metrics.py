@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans sub-millisecond cache hits up to LLM timeouts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    # Thread-safe fixed-bucket histogram (Prometheus semantics)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def raw(self):
+        # (per-bucket counts incl. +Inf, sum, count)
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def snapshot(self):
+        # (cumulative bucket counts incl. +Inf, sum, count)
+        counts, total, count = self.raw()
+        return _cumulative(counts), total, count
+
+
+def _cumulative(counts):
+    cumulative, running = [], 0
+    for c in counts:
+        running += c
+        cumulative.append(running)
+    return cumulative
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class SamplingProfiler:
+    # Samples one thread's Python stack via sys._current_frames() every
+    # `interval` seconds from a helper thread. Used for a single request,
+    # so the overhead is only paid when asked for.
+
+    def __init__(self, thread_id, interval=0.005, max_depth=40):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        if stack:
+            self._stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def report(self, top=15):
+        # Hottest leaf frames plus the heaviest stacks in folded (flamegraph) form
+        stacks = dict(self._stacks)
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack[-1]] += count
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "top_frames": [{"frame": f, "samples": c} for f, c in leaves.most_common(top)],
+            "stacks": [{"stack": ";".join(s), "samples": c}
+                       for s, c in sorted(stacks.items(), key=lambda kv: -kv[1])[:top]]
+        }
+
+
+class Metrics:
+    # Registry of labelled histograms rendered in the Prometheus text
+    # format. stage() times a block into `<namespace>_stage_seconds` and,
+    # inside request(), into that request's own trace. `listeners` get
+    # every observation (the benchmark suite keeps raw samples this way).
+    #
+    # Histograms live in process memory. With `directory` set (several
+    # worker processes), each process also writes its histograms to
+    # `<directory>/<pid>.json` every `flush_interval` seconds, and render()
+    # sums the files of every process, so any worker answering a scrape
+    # reports the whole server. Files of exited workers are kept so the
+    # totals never go backwards; clear the directory when the server starts.
+
+    def __init__(self, namespace="recommender", buckets=DEFAULT_BUCKETS, directory=None, flush_interval=5):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._help = {}
+        self._local = threading.local()
+        self._flusher = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def histogram(self, name, **labels):
+        key = (name, _labels(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+        for listener in self.listeners:
+            listener(name, value, labels)
+        if self.directory and self._flusher is None:
+            self._start_flusher()
+
+    def in_request(self):
+        return getattr(self._local, "trace", None) is not None
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.observe("stage_seconds", elapsed, stage=name)
+            trace = getattr(self._local, "trace", None)
+            if trace is not None:
+                trace[name] = trace.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def request(self, endpoint, profile=False, interval=0.005):
+        # Times a whole request; with profile=True also samples its stack
+        self._local.trace = {}
+        profiler = SamplingProfiler(threading.get_ident(), interval).start() if profile else None
+        self._local.profiler = profiler
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("request_seconds", time.perf_counter() - t0, endpoint=endpoint)
+            if profiler is not None:
+                profiler.stop()
+            self._local.trace = None
+            self._local.profiler = None
+
+    def report(self):
+        # Stage timings (ms) and profile of the current request, or None
+        # unless the request asked to be profiled
+        profiler = getattr(self._local, "profiler", None)
+        if profiler is None:
+            return None
+        trace = getattr(self._local, "trace", None) or {}
+        return {
+            "stages_ms": {k: round(v * 1000, 3) for k, v in trace.items()},
+            "profile": profiler.report()
+        }
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="metrics-flush", daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Metrics flush failed: {e}")
+
+    def _series(self):
+        # {(name, labels): (per-bucket counts, sum, count)} of this process
+        with self._lock:
+            items = list(self._histograms.items())
+        return {key: histogram.raw() for key, histogram in items}
+
+    def flush(self):
+        # Write this process's histograms for render() in sibling processes
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        series = [[name, list(labels), counts, total, count]
+                  for (name, labels), (counts, total, count) in self._series().items()]
+        with open(tmp, "w") as f:
+            json.dump({"buckets": list(self.buckets), "series": series}, f)
+        os.replace(tmp, path)
+
+    def _merged(self):
+        # Sum of every process's flushed histograms, this one's taken live
+        self.flush()
+        merged = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics file {name}: {e}")
+                continue
+            if tuple(data["buckets"]) != tuple(self.buckets):
+                continue
+            for metric, labels, counts, total, count in data["series"]:
+                key = (metric, tuple(tuple(pair) for pair in labels))
+                before = merged.get(key)
+                if before is None:
+                    merged[key] = (counts, total, count)
+                else:
+                    merged[key] = ([a + b for a, b in zip(before[0], counts)], before[1] + total, before[2] + count)
+        return merged
+
+    def render(self):
+        series = self._merged() if self.directory else self._series()
+        lines, described = [], set()
+        for (name, labels), (counts, total, count) in sorted(series.items()):
+            full = f"{self.namespace}_{name}"
+            if name not in described:
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                described.add(name)
+            for bound, seen in zip(self.buckets + ("+Inf",), _cumulative(counts)):
+                lines.append(f"{full}_bucket{_format_labels(labels, [('le', bound)])} {seen}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{full}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
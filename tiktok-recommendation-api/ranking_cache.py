@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class FileRankingBackend:
+    # One JSON file per key under `directory`, written atomically, so that
+    # several worker processes on a host can share cached rankings. Every
+    # `prune_every` writes a daemon thread trims the directory, off the
+    # request path.
+
+    def __init__(self, directory, max_entries=100000, prune_every=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._prune_due = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            return entry["value"], entry["stored_at"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ranking cache file read failed: {e}")
+            return None
+
+    def put(self, key, value, stored_at):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump({"value": value, "stored_at": stored_at}, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"Ranking cache file write failed: {e}")
+            return
+        with self._lock:
+            self._writes += 1
+            if self._writes % self.prune_every:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ranking-cache-prune", daemon=True)
+                self._thread.start()
+        self._prune_due.set()
+
+    def _run(self):
+        while True:
+            self._prune_due.wait()
+            self._prune_due.clear()
+            try:
+                self.prune()
+            except Exception as e:
+                logger.error(f"Ranking cache prune failed: {e}")
+
+    def prune(self):
+        # Drop the oldest files once the directory holds more than max_entries
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        pass
+        excess = len(entries) - self.max_entries
+        if excess > 0:
+            for _, path in sorted(entries)[:excess]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class RankingCache:
+    # LLM rankings keyed on (preference summary, candidate ids). Entries are
+    # fresh for `ttl` seconds and may be served stale for `stale_ttl` more
+    # while one caller revalidates them in the background.
+
+    def __init__(self, maxsize=10000, ttl=300, stale_ttl=0, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "backend_hits": 0}
+
+    @staticmethod
+    def key(preference_text, candidate_ids):
+        digest = hashlib.sha1(preference_text.encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(",".join(candidate_ids).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _state(self, stored_at, now):
+        age = now - stored_at
+        if age <= self.ttl:
+            return "fresh"
+        if age <= self.ttl + self.stale_ttl:
+            return "stale"
+        return None
+
+    def _remember(self, key, value, stored_at):
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        # Returns (value, "fresh" | "stale") or (None, None)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                state = self._state(entry[1], now)
+                if state is None:
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.counters["hits" if state == "fresh" else "stale_hits"] += 1
+                    return entry[0], state
+        if self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None and self._state(entry[1], now) is not None:
+                state = self._state(entry[1], now)
+                with self._lock:
+                    self._remember(key, entry[0], entry[1])
+                    self.counters["backend_hits"] += 1
+                    self.counters["hits" if state == "fresh" else "stale_hits"] += 1
+                return entry[0], state
+        with self._lock:
+            self.counters["misses"] += 1
+        return None, None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._refreshing.discard(key)
+        if self.backend is not None:
+            self.backend.put(key, value, now)
+
+    def begin_refresh(self, key):
+        # Single-flight guard for stale-while-revalidate
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["stale_hits"] + self.counters["misses"]
+            hit_rate = (lookups - self.counters["misses"]) / lookups if lookups else 0.0
+            return dict(self.counters, size=len(self._entries), hit_rate=round(hit_rate, 4))
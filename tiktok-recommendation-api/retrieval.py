@@ -0,0 +1,494 @@
+import math
+import time
+import threading
+import logging
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _GrowableArray:
+    # Amortised O(1) append for 1-D numpy arrays
+    def __init__(self, dtype, capacity=1024):
+        self._data = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = self.size + len(values)
+        if needed > len(self._data):
+            capacity = max(needed, 2 * len(self._data))
+            grown = np.zeros(capacity, dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = values
+        self.size = needed
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+
+def _orthonormalize(y):
+    # Cholesky QR: only small (width x width) factorisations, unlike a
+    # Householder QR of the tall matrix
+    gram = (y.T @ y).astype(np.float64)
+    gram[np.diag_indices_from(gram)] += 1e-6 * max(np.trace(gram) / len(gram), 1e-12)
+    lower = np.linalg.cholesky(gram)
+    return (y @ np.linalg.inv(lower).T.astype(y.dtype)).astype(y.dtype, copy=False)
+
+
+def _blocked_product(rows, dense, block=8192):
+    # Sparse @ dense in row blocks: scipy holds the GIL for a whole
+    # product, so a long one would stall request threads
+    return np.vstack([np.asarray(rows[i:i + block] @ dense) for i in range(0, rows.shape[0], block)])
+
+
+def _blocked_rproduct(rows, dense, block=8192):
+    # rows.T @ dense, accumulated over row blocks
+    out = np.zeros((rows.shape[1], dense.shape[1]), dtype=dense.dtype)
+    for i in range(0, rows.shape[0], block):
+        out += rows[i:i + block].T @ dense[i:i + block]
+    return out
+
+
+class LSAProjector:
+    # Sparse TF-IDF rows -> dense float32 vectors in the top singular
+    # directions of the caption matrix (LSA). Inner products of projected
+    # rows approximate TF-IDF cosine far better than a random projection
+    # of the same size; vectors are not renormalised for the same reason.
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.n_features, self.dim = matrix.shape
+
+    @classmethod
+    def fit(cls, tfidf, dim=128, sample_size=100000, n_iter=4, oversample=10, seed=0):
+        # Randomised truncated SVD (Halko et al.) over a sample of the rows
+        rng = np.random.default_rng(seed)
+        if tfidf.shape[0] > sample_size:
+            tfidf = tfidf[np.sort(rng.choice(tfidf.shape[0], sample_size, replace=False))]
+        tfidf = tfidf.astype(np.float32)
+        dim = max(1, min(dim, tfidf.shape[0], tfidf.shape[1]))
+        width = min(dim + oversample, tfidf.shape[0], tfidf.shape[1])
+        q = _blocked_product(tfidf, rng.standard_normal((tfidf.shape[1], width)).astype(np.float32))
+        for _ in range(n_iter):
+            q = _blocked_product(tfidf, _orthonormalize(_blocked_rproduct(tfidf, _orthonormalize(q))))
+        q = _orthonormalize(q)
+        # Right singular vectors of Q^T A from the eigenvectors of its small Gram matrix
+        bt = _blocked_rproduct(tfidf, q)
+        values, vectors = np.linalg.eigh((bt.T @ bt).astype(np.float64))
+        order = np.argsort(-values)[:dim]
+        order = order[values[order] > 1e-8 * max(values.max(), 1e-12)]
+        components = bt @ (vectors[:, order] / np.sqrt(values[order])).astype(np.float32)
+        return cls(np.ascontiguousarray(components, dtype=np.float32))
+
+    def transform(self, rows):
+        if sparse.issparse(rows):
+            return _blocked_product(rows, self.matrix).astype(np.float32, copy=False)
+        return np.asarray(rows @ self.matrix, dtype=np.float32)
+
+
+class IVFIndex:
+    # Inverted-file ANN index: spherical k-means coarse quantiser, vectors
+    # stored contiguously per list, search scans the `n_probe` closest lists.
+    # Items added after build() are kept in a small pending buffer that is
+    # brute-forced and merged into the lists once it grows.
+
+    def __init__(self, n_lists=None, n_probe=16, train_iters=10, seed=0, merge_ratio=0.1):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_iters = train_iters
+        self.merge_ratio = merge_ratio
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        self.centroids = None
+        self._vectors = None
+        self._ids = None
+        self._offsets = None
+        self._pending_vecs = []
+        self._pending_ids = []
+
+    def __len__(self):
+        size = 0 if self._ids is None else len(self._ids)
+        return size + sum(len(ids) for ids in self._pending_ids)
+
+    def _assign(self, vectors):
+        chunk = max(1, (1 << 24) // max(len(self.centroids), 1))
+        out = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ self.centroids.T, axis=1)
+        return out
+
+    def _train(self, vectors, n_lists):
+        sample_size = min(len(vectors), 32 * n_lists)
+        sample = vectors[self._rng.choice(len(vectors), sample_size, replace=False)]
+        self.centroids = sample[self._rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(self.train_iters):
+            labels = self._assign(sample)
+            onehot = sparse.csr_matrix((np.ones(sample_size, dtype=np.float32), (labels, np.arange(sample_size))),
+                                       shape=(n_lists, sample_size))
+            sums = np.asarray(onehot @ sample, dtype=np.float32)
+            empty = np.bincount(labels, minlength=n_lists) == 0
+            sums[empty] = self.centroids[empty]
+            self.centroids = _normalize(sums)
+
+    def _layout(self, vectors, ids):
+        # (vectors, ids, offsets) grouped by list; centroids are unchanged
+        labels = self._assign(vectors)
+        order = np.argsort(labels, kind="stable")
+        return (np.ascontiguousarray(vectors[order]), np.asarray(ids, dtype=np.int64)[order],
+                np.searchsorted(labels[order], np.arange(len(self.centroids) + 1)))
+
+    def _store(self, vectors, ids):
+        self._vectors, self._ids, self._offsets = self._layout(vectors, ids)
+
+    def build(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._pending_vecs, self._pending_ids = [], []
+            if len(vectors) == 0:
+                self.centroids = self._vectors = self._ids = self._offsets = None
+                return self
+            n_lists = self.n_lists or max(1, int(4 * math.sqrt(len(vectors))))
+            self._train(vectors, min(n_lists, len(vectors)))
+            self._store(vectors, ids)
+        return self
+
+    def add(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return
+        with self._lock:
+            if self.centroids is None:
+                self.build(vectors, ids)
+                return
+            self._pending_vecs.append(vectors)
+            self._pending_ids.append(np.asarray(ids, dtype=np.int64))
+            pending = sum(len(p) for p in self._pending_ids)
+            if pending <= self.merge_ratio * len(self._ids):
+                return
+            base, merged = self._vectors, len(self._pending_ids)
+            vecs = np.vstack([self._vectors] + self._pending_vecs)
+            all_ids = np.concatenate([self._ids] + self._pending_ids)
+        # Merging re-assigns every vector; searches keep running meanwhile
+        layout = self._layout(vecs, all_ids)
+        with self._lock:
+            if self._vectors is base:
+                self._vectors, self._ids, self._offsets = layout
+                del self._pending_vecs[:merged]
+                del self._pending_ids[:merged]
+
+    def state(self):
+        # Arrays describing the built index (pending items merged in)
+        with self._lock:
+            if self.centroids is None:
+                return None
+            if self._pending_ids:
+                self._store(np.vstack([self._vectors] + self._pending_vecs),
+                            np.concatenate([self._ids] + self._pending_ids))
+                self._pending_vecs, self._pending_ids = [], []
+            return {"centroids": self.centroids, "vectors": self._vectors, "ids": self._ids, "offsets": self._offsets}
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        # Arrays may be read-only memory maps: later adds only build new arrays
+        index = cls(**kwargs)
+        if state is not None:
+            index.centroids = state["centroids"]
+            index._vectors = state["vectors"]
+            index._ids = state["ids"]
+            index._offsets = state["offsets"]
+            index.n_lists = len(index.centroids)
+        return index
+
+    def search(self, query, k, exclude=None):
+        # Returns (ids, scores) of the k best matches by inner product
+        with self._lock:
+            if self.centroids is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            query = np.asarray(query, dtype=np.float32).ravel()
+            # Probe the closest n_probe lists, widening until k vectors are covered
+            order = np.argsort(-(self.centroids @ query))
+            sizes = np.diff(self._offsets)[order]
+            n_probe = max(min(self.n_probe, len(order)), int(np.searchsorted(np.cumsum(sizes), k)) + 1)
+            lists = order[:n_probe]
+            parts_ids = [self._ids[self._offsets[c]:self._offsets[c + 1]] for c in lists]
+            parts_vecs = [self._vectors[self._offsets[c]:self._offsets[c + 1]] for c in lists]
+            ids = np.concatenate(parts_ids + self._pending_ids)
+            vecs = np.vstack(parts_vecs + self._pending_vecs)
+        scores = vecs @ query
+        if exclude is not None and len(exclude):
+            scores[np.isin(ids, exclude)] = -np.inf
+        k = min(k, len(ids))
+        if k == 0:
+            return ids[:0], scores[:0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return ids[top], scores[top]
+
+
+class PopularityShortlist:
+    # Time-decayed engagement score over createdAt / likeCount / views.
+    # The constant term lets fresh uploads with no engagement surface.
+    # Scores move slowly, so the ranked head of the catalog is cached for
+    # `cache_seconds` and per-user exclusions are applied to that head.
+
+    def __init__(self, half_life_hours=48.0, like_weight=2.0, view_weight=1.0, cache_seconds=60, head_size=2000):
+        self.half_life_hours = half_life_hours
+        self.like_weight = like_weight
+        self.view_weight = view_weight
+        self.cache_seconds = cache_seconds
+        self.head_size = head_size
+        self._created = _GrowableArray(np.float64)
+        self._likes = _GrowableArray(np.float32)
+        self._views = _GrowableArray(np.float32)
+        self._head = None
+        self._head_at = 0.0
+
+    def __len__(self):
+        return self._created.size
+
+    def set(self, rows, created_ts, likes, views):
+        # rows must be either existing rows (stats refresh) or the next rows in order
+        rows = np.asarray(rows, dtype=np.int64)
+        new = rows >= self._created.size
+        if new.any():
+            order = np.argsort(rows[new])
+            self._created.extend(np.asarray(created_ts, dtype=np.float64)[new][order])
+            self._likes.extend(np.asarray(likes, dtype=np.float32)[new][order])
+            self._views.extend(np.asarray(views, dtype=np.float32)[new][order])
+        old = ~new
+        if old.any():
+            self._created.values[rows[old]] = np.asarray(created_ts, dtype=np.float64)[old]
+            self._likes.values[rows[old]] = np.asarray(likes, dtype=np.float32)[old]
+            self._views.values[rows[old]] = np.asarray(views, dtype=np.float32)[old]
+        self._head = None
+
+    def state(self):
+        return {"created": self._created.values, "likes": self._likes.values, "views": self._views.values}
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        shortlist = cls(**kwargs)
+        for array, values in ((shortlist._created, state["created"]), (shortlist._likes, state["likes"]),
+                              (shortlist._views, state["views"])):
+            array._data, array.size = values, len(values)
+        return shortlist
+
+    def scores(self, now=None):
+        now = time.time() if now is None else now
+        # Read without the writer's lock: trim to rows all three arrays have
+        n = min(self._created.size, self._likes.size, self._views.size)
+        age_hours = np.maximum(now - self._created.values[:n], 0) / 3600.0
+        engagement = (1.0 + self.like_weight * np.log1p(self._likes.values[:n])
+                      + self.view_weight * np.log1p(self._views.values[:n]))
+        return engagement * np.exp2(-age_hours / self.half_life_hours)
+
+    def _top(self, scores, k):
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return top.astype(np.int64), scores[top]
+
+    def top(self, k, exclude=None, now=None):
+        exclude = np.asarray(exclude if exclude is not None else [], dtype=np.int64)
+        current = time.time() if now is None else now
+        head = self._head
+        if head is None or current - self._head_at > self.cache_seconds:
+            head = self._top(self.scores(now), max(self.head_size, k))
+            self._head, self._head_at = head, current
+        rows, scores = head
+        keep = ~np.isin(rows, exclude)
+        if keep.sum() >= k or len(rows) == len(self):
+            return rows[keep][:k], scores[keep][:k]
+        # Heavy user excluded most of the cached head - rank the whole catalog
+        scores = self.scores(now)
+        exclude = exclude[exclude < len(scores)]
+        scores[exclude] = -np.inf
+        return self._top(scores, k)
+
+
+class CandidateGenerator:
+    # Stage one of recommendation: a few hundred caption-ANN neighbours of
+    # the user's preference vector plus a recency/popularity shortlist,
+    # drawn from the whole catalog. Items are caption-index rows. The ANN
+    # shortlist is `rerank` times larger than needed and re-scored with
+    # exact TF-IDF cosine. Catalogs up to `exact_rows` videos skip the ANN
+    # and score every row exactly, which is faster at that size.
+    #
+    # Full rebuilds (after a caption refit) run in the catalog sync thread
+    # without holding `_lock` and are swapped in whole; `_sync_lock` only
+    # serialises the writers. generate() takes a consistent set of
+    # references under `_lock` and searches outside it.
+
+    def __init__(self, caption_index, dim=128, n_probe=64, ann_candidates=200, popular_candidates=100, rerank=64,
+                 exact_rows=300000):
+        self.caption_index = caption_index
+        self.dim = dim
+        self.rerank = rerank
+        self.exact_rows = exact_rows
+        self.ann_candidates = ann_candidates
+        self.popular_candidates = popular_candidates
+        self.ann = IVFIndex(n_probe=n_probe)
+        self.popularity = PopularityShortlist()
+        self._projector = None
+        self._index_version = None
+        self._indexed_rows = 0
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+
+    def _build(self, matrix):
+        projector = LSAProjector.fit(matrix, self.dim)
+        ann = IVFIndex(n_probe=self.ann.n_probe).build(projector.transform(matrix), np.arange(matrix.shape[0]))
+        return projector, ann
+
+    def _swap(self, projector, ann, version, rows):
+        with self._lock:
+            self._projector, self.ann = projector, ann
+            self._index_version = version
+            self._indexed_rows = rows
+
+    def _sync_ann(self):
+        # Keep the ANN index in step with the caption index (rebuild on refit)
+        with self._sync_lock:
+            index = self.caption_index
+            if not index.is_fitted:
+                return
+            matrix = index.matrix
+            if self._index_version != index.version:
+                version = index.version
+                projector, ann = self._build(matrix)
+                self._swap(projector, ann, version, matrix.shape[0])
+                logger.info(f"ANN index built over {matrix.shape[0]} videos")
+            elif matrix.shape[0] > self._indexed_rows:
+                rows = np.arange(self._indexed_rows, matrix.shape[0])
+                self.ann.add(self._projector.transform(matrix[rows]), rows)
+                self._indexed_rows = matrix.shape[0]
+
+    def refit(self):
+        # Refit the caption index and rebuild the ANN index over it, both
+        # off-lock; requests see the old pair until the new one is swapped in
+        with self._sync_lock:
+            fitted = self.caption_index.prepare_fit()
+            if fitted is None:
+                return
+            projector, ann = self._build(fitted.matrix)
+            with self._lock:
+                self.caption_index.commit_fit(fitted)
+                self._projector, self.ann = projector, ann
+                self._index_version = self.caption_index.version
+                self._indexed_rows = fitted.matrix.shape[0]
+            logger.info(f"ANN index rebuilt over {fitted.matrix.shape[0]} videos after refit")
+        # Rows indexed while the refit ran
+        self._sync_ann()
+
+    def update_stats(self, video_stats):
+        # video_stats: iterable of (video_id, created_ts, likes, views) for indexed videos
+        rows, created, likes, views = [], [], [], []
+        with self._lock:
+            for vid, ts, lc, vc in video_stats:
+                row = self.caption_index.row_of(vid)
+                if row is None:
+                    continue
+                rows.append(row)
+                created.append(ts)
+                likes.append(lc)
+                views.append(vc)
+            if rows:
+                given = set(rows)
+                missing = [r for r in range(len(self.popularity), max(rows) + 1) if r not in given]
+                if missing:
+                    # Keep popularity rows aligned with caption rows
+                    rows += missing
+                    created += [0.0] * len(missing)
+                    likes += [0] * len(missing)
+                    views += [0] * len(missing)
+                self.popularity.set(rows, created, likes, views)
+        self._sync_ann()
+
+    def _rerank(self, matrix, rows, user_vec):
+        # Exact TF-IDF cosine over the ANN shortlist; rows the ANN index
+        # gained after `matrix` was taken are dropped
+        rows = rows[rows < matrix.shape[0]]
+        if len(rows) == 0:
+            return rows
+        scores = matrix[rows] @ user_vec
+        return rows[np.argsort(-scores, kind="stable")[:self.ann_candidates]]
+
+    def _exact(self, matrix, user_vec, exclude):
+        scores = np.asarray(matrix @ user_vec, dtype=np.float32).ravel()
+        scores[exclude[exclude < len(scores)]] = -np.inf
+        k = min(self.ann_candidates, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top[np.isfinite(scores[top])]
+
+    def generate(self, user_vec, exclude_ids=(), exclude_rows=None):
+        if self._projector is None:
+            # First use before the sync thread got to it
+            self._sync_ann()
+        with self._lock:
+            index, projector, ann, popularity = self.caption_index, self._projector, self.ann, self.popularity
+            matrix = index.matrix if index.is_fitted else None
+            row_ids = index.row_ids
+        if exclude_rows is not None:
+            exclude = np.asarray(exclude_rows, dtype=np.int64)
+        else:
+            exclude = np.array([r for r in (index.row_of(v) for v in exclude_ids) if r is not None], dtype=np.int64)
+        rows = []
+        # A vector computed just before a refit was swapped in has the old vocabulary
+        current = user_vec is not None and matrix is not None and user_vec.shape[0] == matrix.shape[1]
+        if current and matrix.shape[0] <= self.exact_rows:
+            rows.extend(self._exact(matrix, user_vec, exclude).tolist())
+        elif current and projector is not None and user_vec.shape[0] == projector.n_features:
+            query = projector.transform(user_vec.reshape(1, -1))[0]
+            ann_rows, _ = ann.search(query, self.ann_candidates * self.rerank, exclude)
+            rows.extend(self._rerank(matrix, ann_rows, user_vec).tolist())
+        pop_rows, _ = popularity.top(self.popular_candidates, exclude)
+        seen = set(rows)
+        rows.extend(r for r in pop_rows.tolist() if r not in seen and r < len(row_ids))
+        return [row_ids[r] for r in rows]
+
+    def export_state(self):
+        # Everything a snapshot needs to recreate this generator without rebuilding
+        self._sync_ann()
+        with self._lock:
+            return {
+                "index_version": self._index_version,
+                "projector": None if self._projector is None else self._projector.matrix,
+                "ann": self.ann.state(),
+                "popularity": self.popularity.state()
+            }
+
+    def attach(self, caption_index, state):
+        # Swap in a published snapshot built over `caption_index`
+        ann = IVFIndex.from_state(state["ann"], n_probe=self.ann.n_probe)
+        popularity = PopularityShortlist.from_state(state["popularity"])
+        projector = LSAProjector(state["projector"]) if state["projector"] is not None else None
+        with self._sync_lock, self._lock:
+            self.caption_index = caption_index
+            self.ann = ann
+            self.popularity = popularity
+            self._projector = projector
+            self._index_version = caption_index.version
+            self._indexed_rows = len(ann)
+
+    def popular_rows(self, k):
+        # Shared candidate pool for batch scoring: (rows, popularity scores)
+        with self._lock:
+            return self.popularity.top(k)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import shutil
+import threading
+import logging
+
+import numpy as np
+
+from caption_index import CaptionIndex
+from user_profiles import ItemIdMap
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout under the root directory:
+#   CURRENT                     name of the live version (replaced atomically)
+#   versions/<name>/caption/    CaptionIndex.save() output
+#   versions/<name>/*.npy       ANN, projector, popularity and item CF arrays
+#   versions/<name>/manifest.json
+CURRENT = "CURRENT"
+VERSIONS = "versions"
+
+# (file, mmap mode): "r" is shared read-only; "c" is copy-on-write for
+# arrays the worker may update in place
+ARRAYS = {
+    "projector": "r",
+    "ann_centroids": "r",
+    "ann_vectors": "r",
+    "ann_ids": "r",
+    "ann_offsets": "r",
+    "pop_created": "c",
+    "pop_likes": "c",
+    "pop_views": "c",
+    "cf_items": "r",
+    "cf_nbr_idx": "r",
+    "cf_nbr_sim": "r",
+}
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _next_name(root):
+    existing = os.listdir(os.path.join(root, VERSIONS))
+    numbers = [int(name[1:]) for name in existing if name.startswith("v") and name[1:].isdigit()]
+    return f"v{max(numbers, default=0) + 1:08d}"
+
+
+def _export(caption_index, candidates, item_cf, path, attempts=3):
+    # The caption index may be refitted by the catalog thread while we
+    # write; retry until the ANN state and the saved index agree.
+    for _ in range(attempts):
+        state = candidates.export_state()
+        caption_index.save(os.path.join(path, "caption"))
+        if state["index_version"] == caption_index.version:
+            break
+    else:
+        raise RuntimeError("Caption index kept changing during snapshot export")
+
+    arrays = {}
+    if state["projector"] is not None:
+        arrays["projector"] = state["projector"]
+    if state["ann"] is not None:
+        for key in ("centroids", "vectors", "ids", "offsets"):
+            arrays[f"ann_{key}"] = state["ann"][key]
+    for key in ("created", "likes", "views"):
+        arrays[f"pop_{key}"] = state["popularity"][key]
+    if item_cf is not None:
+        nbr_idx, nbr_sim = item_cf.table()
+        items = item_cf.item_ids.ids()
+        arrays["cf_items"] = np.array([str(v) for v in items], dtype="S24")
+        arrays["cf_nbr_idx"] = nbr_idx
+        arrays["cf_nbr_sim"] = nbr_sim
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    return {"videos": len(caption_index), "items": len(arrays.get("cf_items", ())),
+            "item_cf_built_at": getattr(item_cf, "built_at", 0.0)}
+
+
+def publish(root, caption_index, candidates, item_cf=None, keep=3):
+    # Writes a new version next to the live one, then points CURRENT at it
+    os.makedirs(os.path.join(root, VERSIONS), exist_ok=True)
+    name = _next_name(root)
+    tmp = os.path.join(root, f".tmp-{name}-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        manifest = _export(caption_index, candidates, item_cf, tmp)
+        manifest.update(name=name, created_at=time.time())
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        os.rename(tmp, os.path.join(root, VERSIONS, name))
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(root, f".{CURRENT}.{os.getpid()}")
+    with open(pointer, "w") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(root, CURRENT))
+    logger.info(f"Published index snapshot {name}: {manifest['videos']} videos")
+    prune(root, keep)
+    return name
+
+
+def prune(root, keep=3):
+    # Workers that still map an old version keep their mappings after unlink
+    live = current_version(root)
+    names = sorted(n for n in os.listdir(os.path.join(root, VERSIONS)) if n.startswith("v"))
+    for name in names[:-keep] if keep > 0 else names:
+        if name != live:
+            shutil.rmtree(os.path.join(root, VERSIONS, name), ignore_errors=True)
+
+
+class Snapshot:
+    # A loaded version: memory-mapped arrays plus the per-process id maps
+
+    def __init__(self, name, caption_index, candidate_state, item_ids, nbr_idx, nbr_sim, manifest):
+        self.name = name
+        self.caption_index = caption_index
+        self.candidate_state = candidate_state
+        self.item_ids = item_ids
+        self.nbr_idx = nbr_idx
+        self.nbr_sim = nbr_sim
+        self.manifest = manifest
+
+
+def load(root, name, id_parser=None):
+    path = os.path.join(root, VERSIONS, name)
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    arrays = {}
+    for key, mode in ARRAYS.items():
+        file = os.path.join(path, f"{key}.npy")
+        if os.path.exists(file):
+            arrays[key] = np.load(file, mmap_mode=mode)
+
+    caption_index = CaptionIndex.load(os.path.join(path, "caption"), id_parser=id_parser)
+    ann = None
+    if "ann_centroids" in arrays:
+        ann = {key: arrays[f"ann_{key}"] for key in ("centroids", "vectors", "ids", "offsets")}
+    candidate_state = {
+        "projector": arrays.get("projector"),
+        "ann": ann,
+        "popularity": {key: arrays[f"pop_{key}"] for key in ("created", "likes", "views")}
+    }
+
+    item_ids = nbr_idx = nbr_sim = None
+    if "cf_items" in arrays:
+        parse = id_parser or (lambda s: s)
+        item_ids = ItemIdMap.from_ids([parse(b.decode()) for b in arrays["cf_items"].tolist()])
+        nbr_idx, nbr_sim = arrays["cf_nbr_idx"], arrays["cf_nbr_sim"]
+    return Snapshot(name, caption_index, candidate_state, item_ids, nbr_idx, nbr_sim, manifest)
+
+
+class SnapshotWatcher:
+    # Serving side: follows CURRENT and hands each new version to `apply`.
+    # The first load happens synchronously; afterwards a daemon polls every
+    # `interval` seconds.
+
+    def __init__(self, root, apply, id_parser=None, interval=10):
+        self.root = root
+        self.apply = apply
+        self.id_parser = id_parser
+        self.interval = interval
+        self.version = None
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.version is not None
+
+    def poll(self):
+        # Returns True when a new version was swapped in
+        name = current_version(self.root)
+        if name is None or name == self.version:
+            return False
+        with self._lock:
+            if name == self.version:
+                return False
+            t0 = time.time()
+            snapshot = load(self.root, name, id_parser=self.id_parser)
+            self.apply(snapshot)
+            self.version = name
+            self.loads += 1
+        logger.info(f"Index snapshot {name} mapped in {time.time() - t0:.2f}s")
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Snapshot refresh failed: {e}")
+
+    def ensure_ready(self):
+        if not self.ready:
+            self.poll()
+        if self._thread is None and self.interval > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+                    self._thread.start()
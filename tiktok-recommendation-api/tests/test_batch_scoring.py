@@ -0,0 +1,37 @@
+import numpy as np
+
+from batch_scoring import CandidateMatrix, score_chunk
+from caption_index import CaptionIndex
+from user_profiles import ItemIdMap, UserProfile
+
+WORDS = ["cat", "dog", "surf", "beach", "guitar", "cooking", "pasta", "speedrun", "boss", "sunset"]
+
+
+def setup(n=200):
+    rng = np.random.default_rng(0)
+    index = CaptionIndex().fit((f"v{i}", " ".join(rng.choice(WORDS, 3))) for i in range(n))
+    item_ids = ItemIdMap()
+    candidates = CandidateMatrix(index, item_ids, np.arange(n), rng.random(n))
+    return index, item_ids, candidates
+
+
+def test_scores_match_exact_cosine_and_skip_seen():
+    index, item_ids, candidates = setup()
+    liked = ["v1", "v2"]
+    profile = UserProfile(item_ids.assign(liked), [], liked)
+    vec = index.user_vector(liked)
+    (ranked,), has_vector = score_chunk(candidates, [profile], [vec], 10, prior_weight=0.0)
+    assert has_vector.tolist() == [True]
+    cols = [c for c, _ in ranked]
+    assert not {1, 2} & set(cols)
+    exact = index.matrix @ vec
+    assert np.allclose([s for _, s in ranked], exact[cols], atol=1e-5)
+
+
+def test_vector_from_another_vocabulary_falls_back_to_the_prior():
+    _, item_ids, candidates = setup()
+    profile = UserProfile([], [], [])
+    stale = np.ones(candidates.n_features + 3, dtype=np.float32)
+    (ranked,), has_vector = score_chunk(candidates, [profile], [stale], 5)
+    assert has_vector.tolist() == [False]
+    assert [c for c, _ in ranked] == np.argsort(-candidates.prior)[:5].tolist()
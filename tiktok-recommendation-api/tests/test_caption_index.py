@@ -0,0 +1,72 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from caption_index import CaptionIndex
+
+WORDS = ["cat", "dog", "surf", "beach", "guitar", "cooking", "pasta", "speedrun", "boss", "sunset"]
+
+
+def captions(n, start=0):
+    rng = np.random.default_rng(start)
+    return [(f"v{i}", " ".join(rng.choice(WORDS, 4))) for i in range(start, start + n)]
+
+
+@pytest.fixture
+def index():
+    return CaptionIndex().fit(captions(300))
+
+
+def test_save_load_round_trip(index, tmp_path):
+    path = str(tmp_path / "caption")
+    assert index.save(path)
+    loaded = CaptionIndex.load(path)
+
+    assert len(loaded) == len(index)
+    assert loaded.video_id_at(17) == index.video_id_at(17)
+    assert abs(loaded.matrix - index.matrix).sum() == 0
+    # Frozen vocabulary/IDF transforms new captions exactly like the original
+    text = ["surf beach sunset guitar"]
+    assert np.allclose(loaded.vectorizer.transform(text).toarray(), index.vectorizer.transform(text).toarray())
+
+
+def test_save_skipped_when_unchanged(index, tmp_path):
+    path = str(tmp_path / "caption")
+    index.save(path)
+    loaded = CaptionIndex.load(path)
+    mtime = os.path.getmtime(os.path.join(path, "data.npy"))
+
+    assert loaded.save(path) is False
+    assert os.path.getmtime(os.path.join(path, "data.npy")) == mtime
+
+
+def test_save_over_mapped_files(index, tmp_path):
+    # Restart with new videos: saving must not touch the files this index maps
+    path = str(tmp_path / "caption")
+    index.save(path)
+    loaded = CaptionIndex.load(path)
+    mapped = loaded.matrix
+    before = float(mapped.data.sum())
+
+    loaded.add(captions(20, start=300))
+    assert loaded.save(path)
+
+    assert float(mapped.data.sum()) == before
+    reloaded = CaptionIndex.load(path)
+    assert len(reloaded) == 320
+    assert abs(reloaded.matrix - loaded.matrix).sum() == 0
+    assert sorted(os.listdir(tmp_path)) == ["caption"]
+
+
+def test_concurrent_adds_of_the_same_videos_append_once(index):
+    new = captions(200, start=300)
+    threads = [threading.Thread(target=index.add, args=(new + new[:50],)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(index) == 500
+    assert index.matrix.shape[0] == 500
+    assert [index.video_id_at(i) for i in range(500)] == [vid for vid, _ in captions(300) + new]
@@ -0,0 +1,57 @@
+import pytest
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from benchmarks.fake_mongo import FakeDB
+from comment_summaries import CommentSummaryCache
+
+
+def comments_db(per_video):
+    db = FakeDB(latency=0)
+    db.Comments.insert_many([{"videoId": vid, "text": f" {vid}-{i} "} for vid in ("a", "b") for i in range(per_video)])
+    return db
+
+
+def test_summaries_use_first_comments_only():
+    db = comments_db(20)
+    cache = CommentSummaryCache(per_video=3)
+    summaries = cache.get_many(db.Comments, ["a", "b", "c"])
+
+    assert summaries == {"a": "a-0 a-1 a-2", "b": "b-0 b-1 b-2", "c": ""}
+    # One group per video leaves the server, not all 40 comments
+    assert db.documents == 2
+    assert cache.get_many(db.Comments, ["a"]) == {"a": "a-0 a-1 a-2"}
+    assert cache.stats()["hits"] == 1
+
+
+def test_falls_back_to_push_slice_without_firstn():
+    db = comments_db(5)
+    aggregate = db.Comments.aggregate
+
+    def old_server(pipeline):
+        if any("$firstN" in str(stage) for stage in pipeline):
+            raise OperationFailure("unknown group operator '$firstN'", code=15952)
+        return aggregate(pipeline)
+
+    db.Comments.aggregate = old_server
+    cache = CommentSummaryCache(per_video=2)
+    assert cache.get_many(db.Comments, ["a"]) == {"a": "a-0 a-1"}
+    assert cache.first_n is False
+
+
+def test_transient_errors_keep_firstn():
+    db = comments_db(5)
+    aggregate = db.Comments.aggregate
+    failures = [AutoReconnect("primary stepped down"), OperationFailure("operation exceeded time limit", code=50)]
+
+    def flaky(pipeline):
+        if failures:
+            raise failures.pop(0)
+        return aggregate(pipeline)
+
+    db.Comments.aggregate = flaky
+    cache = CommentSummaryCache(per_video=2)
+    for _ in range(2):
+        with pytest.raises((AutoReconnect, OperationFailure)):
+            cache.get_many(db.Comments, ["a"])
+    assert cache.first_n is True
+    assert cache.get_many(db.Comments, ["a"]) == {"a": "a-0 a-1"}
@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+from bson import ObjectId
+
+from feed_sessions import FeedSessionStore, decode_cursor, encode_cursor
+from ranking_cache import FileRankingBackend
+
+
+def store_with(n=30, **kwargs):
+    store = FeedSessionStore(**kwargs)
+    video_ids = [f"v{i}" for i in range(n)]
+    session_id = store.create("u1", video_ids, [{"videoId": v} for v in video_ids], {"total": n})
+    return store, session_id
+
+
+def ids(items):
+    return [item["videoId"] for item in items]
+
+
+def test_pages_walk_the_list_without_gaps():
+    store, session_id = store_with(25)
+    served, offset = [], 0
+    while offset is not None:
+        items, offset, metadata = store.page(session_id, offset, "u1", 10)
+        assert len(items) <= 10
+        served += ids(items)
+    assert served == [f"v{i}" for i in range(25)]
+    assert metadata == {"total": 25}
+
+
+def test_seen_items_are_skipped_and_pages_stay_full():
+    store, session_id = store_with(30)
+    seen = {f"v{i}" for i in range(0, 30, 3)}
+
+    def seen_mask(video_ids):
+        return np.array([v in seen for v in video_ids])
+
+    items, offset, _ = store.page(session_id, 0, "u1", 5, seen_mask)
+    assert ids(items) == ["v1", "v2", "v4", "v5", "v7"]
+    # The cursor resumes right after the last item served
+    assert offset == 8
+    items, offset, _ = store.page(session_id, offset, "u1", 50, seen_mask)
+    assert ids(items) == [f"v{i}" for i in range(8, 30) if f"v{i}" not in seen]
+    assert offset is None
+    assert store.stats()["filtered"] == 10
+
+
+def test_limit_and_offset_are_clamped():
+    store, session_id = store_with(10)
+    items, offset, _ = store.page(session_id, -2, "u1", 3)
+    assert ids(items) == ["v0", "v1", "v2"] and offset == 3
+    # A zero limit still makes progress instead of returning empty pages forever
+    items, offset, _ = store.page(session_id, offset, "u1", 0)
+    assert ids(items) == ["v3"] and offset == 4
+
+
+def test_unknown_foreign_and_expired_sessions():
+    store, session_id = store_with(5, ttl=60)
+    assert store.page("missing", 0, "u1", 5) is None
+    assert store.page(session_id, 0, "u2", 5) is None
+    store._sessions[session_id].created_at = time.time() - 61
+    assert store.page(session_id, 0, "u1", 5) is None
+    assert store.stats()["size"] == 0
+
+
+def test_lru_bound_and_cursor_round_trip():
+    store = FeedSessionStore(maxsize=2)
+    first = store.create("u1", [], [])
+    store.create("u1", [], [])
+    store.create("u1", [], [])
+    assert store.page(first, 0, "u1", 5) is None
+    assert decode_cursor(encode_cursor("abc_-", 42)) == ("abc_-", 42)
+    assert decode_cursor("not a cursor") is None
+
+
+def test_backend_serves_sessions_created_by_another_worker(tmp_path):
+    backend = FileRankingBackend(str(tmp_path))
+    creator = FeedSessionStore(backend=backend, id_parser=ObjectId)
+    user, videos = ObjectId(), [ObjectId() for _ in range(6)]
+    session_id = creator.create(user, videos, [{"videoId": str(v)} for v in videos], {"total": 6})
+
+    sibling = FeedSessionStore(backend=FileRankingBackend(str(tmp_path)), id_parser=ObjectId)
+    items, next_offset, metadata = sibling.page(session_id, 2, user, 2, lambda ids: np.array([v == videos[2] for v in ids]))
+    assert ids(items) == [str(videos[3]), str(videos[4])]
+    assert next_offset == 5 and metadata == {"total": 6}
+    assert sibling.page(session_id, 0, ObjectId(), 2) is None
+    assert sibling.page("../" + session_id[3:], 0, user, 2) is None
+    assert sibling.stats()["backend_hits"] == 1
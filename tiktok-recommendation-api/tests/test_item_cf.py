@@ -0,0 +1,74 @@
+import numpy as np
+
+from item_cf import ItemNeighbours
+
+
+def interactions(n_users=40, n_items=60, per_user=12, seed=0):
+    rng = np.random.default_rng(seed)
+    likes, views = [], []
+    for u in range(n_users):
+        items = rng.choice(n_items, per_user, replace=False)
+        likes += [(f"u{u}", f"v{i}") for i in items[:per_user // 3]]
+        views += [(f"u{u}", f"v{i}") for i in items]
+    return likes, views
+
+
+def rows(table):
+    # Neighbour lists as {item: {neighbour: similarity}}, ignoring tie order
+    idx, sim = table
+    return [{int(j): float(s) for j, s in zip(idx[i], sim[i]) if j >= 0} for i in range(len(idx))]
+
+
+def assert_same_tables(refreshed, rebuilt):
+    assert len(refreshed) == len(rebuilt)
+    for i, (a, b) in enumerate(zip(refreshed, rebuilt)):
+        assert a.keys() == b.keys(), i
+        assert np.allclose([a[j] for j in a], [b[j] for j in a], atol=1e-6), i
+
+
+def random_events(model, rng, n_events, n_users=45, n_items=65):
+    for _ in range(n_events):
+        kind = rng.choice(["like", "dislike", "view"])
+        model.apply(kind, f"u{rng.integers(n_users)}", f"v{rng.integers(n_items)}")
+
+
+def test_refresh_matches_rebuild():
+    rng = np.random.default_rng(1)
+    model = ItemNeighbours(n_neighbours=80)
+    model.load(*interactions())
+    for _ in range(5):
+        random_events(model, rng, 15)
+        assert model.refresh() > 0
+        refreshed = rows(model.table())
+        model.rebuild()
+        assert_same_tables(refreshed, rows(model.table()))
+
+
+def test_refresh_matches_rebuild_with_capped_users():
+    # A single event on a user over max_user_items can push one of their
+    # other items out of the matrix, changing rows they never touched
+    rng = np.random.default_rng(2)
+    model = ItemNeighbours(n_neighbours=80, max_user_items=10)
+    model.load(*interactions(n_users=150, n_items=300))
+    for _ in range(10):
+        random_events(model, rng, 1, n_users=150, n_items=300)
+        model.refresh()
+        refreshed = rows(model.table())
+        model.rebuild()
+        assert_same_tables(refreshed, rows(model.table()))
+
+
+def test_events_apply_in_arrival_order():
+    model = ItemNeighbours()
+    model.load([("u0", "v0"), ("u1", "v1")], [])
+    model.apply("dislike", "u0", "v0")
+    model.apply("like", "u0", "v0")
+    model.apply("like", "u1", "v2")
+    model.apply("dislike", "u1", "v2")
+    model.refresh()
+    assert model.stats()["likes"] == 2
+    likes = {(int(k) >> 32, int(k) & 0xFFFFFFFF) for k in model._likes}
+    user, item = model.user_ids.lookup(["u0"])[0], model.item_ids.lookup(["v0"])[0]
+    assert (user, item) in likes
+    user, item = model.user_ids.lookup(["u1"])[0], model.item_ids.lookup(["v2"])[0]
+    assert (user, item) not in likes
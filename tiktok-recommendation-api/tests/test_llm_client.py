@@ -0,0 +1,106 @@
+import time
+
+from llm_client import CircuitBreaker, LLMClient
+
+
+class StubResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ""
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class StubSession:
+    # Replays `responses` (the last one repeats) and counts provider hits
+    def __init__(self, *responses, delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+def client(session, deadline=1.0, **breaker):
+    llm = LLMClient("http://llm.test", "key", deadline=deadline, backoff=0.001, max_backoff=0.001,
+                    breaker=CircuitBreaker(**breaker))
+    llm.session = session
+    return llm
+
+
+def test_breaker_transitions():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_retries_stop_once_the_circuit_opens():
+    session = StubSession(StubResponse(503))
+    llm = client(session, failure_threshold=1)
+    assert llm.generate({}) is None
+    assert session.calls == 1
+    assert llm.breaker.state == "open"
+    assert llm.generate({}) is None
+    assert session.calls == 1 and llm.stats()["short_circuit"] == 1
+
+
+def test_retries_while_closed_then_success():
+    session = StubSession(StubResponse(503), StubResponse(503), StubResponse(200, {"generations": []}))
+    llm = client(session, failure_threshold=5)
+    assert llm.generate({}) == {"generations": []}
+    assert session.calls == 3
+    assert llm.breaker.state == "closed"
+
+
+def test_half_open_trial_is_a_single_attempt():
+    session = StubSession(StubResponse(503))
+    llm = client(session, failure_threshold=1, reset_timeout=0.05)
+    llm.generate({})
+    time.sleep(0.06)
+    assert llm.breaker.state == "half_open"
+    assert llm.generate({}) is None
+    assert session.calls == 2
+    assert llm.breaker.state == "open"
+
+
+def test_deadline_falls_back_without_waiting_for_the_provider():
+    session = StubSession(StubResponse(200, {"generations": []}), delay=0.3)
+    llm = client(session, deadline=0.05)
+    t0 = time.monotonic()
+    assert llm.generate({}) is None
+    assert time.monotonic() - t0 < 0.2
+    assert llm.stats()["timeout"] == 1
+
+
+def test_retry_after_beyond_the_budget_opens_the_circuit_for_that_long():
+    session = StubSession(StubResponse(429, headers={"Retry-After": "10"}))
+    llm = client(session, deadline=0.5, failure_threshold=5, reset_timeout=0.01)
+    t0 = time.monotonic()
+    assert llm.generate({}) is None
+    # Gave up at once instead of sleeping past the deadline
+    assert time.monotonic() - t0 < 0.2
+    assert session.calls == 1
+    time.sleep(0.02)
+    assert llm.breaker.state == "open"
@@ -0,0 +1,39 @@
+import os
+
+from metrics import Metrics
+
+
+def counts(text, line_prefix):
+    return [line.rsplit(" ", 1)[1] for line in text.splitlines() if line.startswith(line_prefix)]
+
+
+def test_render_sums_every_worker_file(tmp_path):
+    # Another worker: same layout, different pid file
+    sibling = Metrics(directory=str(tmp_path))
+    sibling.observe("stage_seconds", 0.02, stage="tfidf")
+    sibling.observe("stage_seconds", 0.3, stage="llm_call")
+    sibling.flush()
+    os.replace(tmp_path / f"{os.getpid()}.json", tmp_path / "1.json")
+
+    local = Metrics(directory=str(tmp_path))
+    local.observe("stage_seconds", 0.04, stage="tfidf")
+    text = local.render()
+
+    assert counts(text, 'recommender_stage_seconds_count{stage="tfidf"}') == ["2"]
+    assert counts(text, 'recommender_stage_seconds_count{stage="llm_call"}') == ["1"]
+    assert counts(text, 'recommender_stage_seconds_bucket{stage="tfidf",le="+Inf"}') == ["2"]
+    assert sorted(os.listdir(tmp_path)) == ["1.json", f"{os.getpid()}.json"]
+
+
+def test_render_without_directory_is_process_local():
+    metrics = Metrics()
+    metrics.observe("request_seconds", 0.1, endpoint="recommend")
+    assert counts(metrics.render(), 'recommender_request_seconds_count{endpoint="recommend"}') == ["1"]
+
+
+def test_in_request_only_inside_request():
+    metrics = Metrics()
+    assert not metrics.in_request()
+    with metrics.request("recommend"):
+        assert metrics.in_request()
+    assert not metrics.in_request()
@@ -0,0 +1,31 @@
+import os
+import threading
+import time
+
+from ranking_cache import FileRankingBackend, RankingCache
+
+
+def files(directory):
+    return sum(len([n for n in names if n.endswith(".json")]) for _, _, names in os.walk(directory))
+
+
+def test_file_backend_round_trip_and_shared_between_caches(tmp_path):
+    backend = FileRankingBackend(str(tmp_path))
+    writer, reader = RankingCache(backend=backend), RankingCache(backend=FileRankingBackend(str(tmp_path)))
+    key = RankingCache.key("likes cats", ["a", "b"])
+    writer.put(key, [1, 0])
+    assert reader.get(key)[0] == [1, 0]
+
+
+def test_prune_runs_off_the_writing_thread(tmp_path, monkeypatch):
+    backend = FileRankingBackend(str(tmp_path), max_entries=20, prune_every=50)
+    pruned_on = []
+    prune = backend.prune
+    monkeypatch.setattr(backend, "prune", lambda: pruned_on.append(threading.current_thread().name) or prune())
+    for i in range(100):
+        backend.put(f"{i:040x}", [i], time.time())
+    deadline = time.time() + 5
+    while files(str(tmp_path)) > 20 and time.time() < deadline:
+        time.sleep(0.01)
+    assert files(str(tmp_path)) == 20
+    assert pruned_on and set(pruned_on) == {"ranking-cache-prune"}
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from caption_index import CaptionIndex
+from retrieval import IVFIndex, CandidateGenerator, LSAProjector
+
+
+def clustered(n, dim=32, n_clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, dim))
+    vectors = centres[rng.integers(0, n_clusters, n)] + 0.3 * rng.standard_normal((n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def brute_force(vectors, query, k, exclude=()):
+    scores = vectors @ query
+    scores[list(exclude)] = -np.inf
+    return set(np.argsort(-scores)[:k].tolist())
+
+
+def test_ivf_search_matches_brute_force():
+    vectors = clustered(5000)
+    index = IVFIndex(n_probe=16).build(vectors, np.arange(len(vectors)))
+    rng = np.random.default_rng(1)
+    recalls = []
+    for q in vectors[rng.choice(len(vectors), 20, replace=False)]:
+        ids, scores = index.search(q, 50)
+        assert np.all(np.diff(scores) <= 0)
+        assert np.allclose(scores, vectors[ids] @ q, atol=1e-5)
+        recalls.append(len(set(ids.tolist()) & brute_force(vectors, q, 50)) / 50)
+    assert np.mean(recalls) > 0.9
+
+
+def test_ivf_probing_every_list_is_exact():
+    vectors = clustered(2000)
+    index = IVFIndex(n_lists=20, n_probe=20).build(vectors, np.arange(len(vectors)))
+    q = vectors[7]
+    ids, _ = index.search(q, 30, exclude=np.array([7, 8]))
+    assert set(ids.tolist()) == brute_force(vectors, q, 30, exclude=(7, 8))
+
+
+def test_ivf_pending_and_merged_adds_are_searchable():
+    vectors = clustered(3000)
+    index = IVFIndex(n_lists=10, n_probe=10, merge_ratio=0.1).build(vectors[:2000], np.arange(2000))
+    index.add(vectors[2000:2100], np.arange(2000, 2100))  # stays pending
+    index.add(vectors[2100:], np.arange(2100, 3000))      # triggers a merge
+    assert len(index) == 3000
+    q = vectors[2500]
+    ids, _ = index.search(q, 25)
+    assert set(ids.tolist()) == brute_force(vectors, q, 25)
+
+
+def test_lsa_projector_is_orthonormal():
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(300)]
+    index = CaptionIndex().fit((i, " ".join(rng.choice(words, 6))) for i in range(1000))
+    projector = LSAProjector.fit(index.matrix, dim=32)
+    assert projector.matrix.shape == (index.matrix.shape[1], 32)
+    assert np.allclose(projector.matrix.T @ projector.matrix, np.eye(32), atol=1e-4)
+
+
+@pytest.mark.parametrize("exact_rows", [0, 300000], ids=["ann", "exact"])
+def test_generate_excludes_rows_and_survives_refit(exact_rows):
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(200)]
+    index = CaptionIndex().fit((i, " ".join(rng.choice(words, 5))) for i in range(2000))
+    generator = CandidateGenerator(index, ann_candidates=50, popular_candidates=0, exact_rows=exact_rows)
+    generator.update_stats([])
+    user_vec = index.user_vector([1, 2, 3])
+    rows = generator.generate(user_vec, exclude_rows=[1, 2, 3])
+    assert len(rows) == 50 and not {1, 2, 3} & set(rows)
+
+    # A vector from before the refit must not break generate() afterwards
+    index.add((2000 + i, " ".join(rng.choice(words, 5)) + f" new{i}") for i in range(1500))
+    assert index.needs_refit
+    generator.refit()
+    assert not index.needs_refit
+    generator.generate(user_vec)
+    assert len(generator.generate(index.user_vector([1, 2, 3]))) == 50
+
+
+def test_generate_runs_outside_the_generator_lock_while_the_catalog_grows():
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(200)]
+    index = CaptionIndex().fit((i, " ".join(rng.choice(words, 5))) for i in range(2000))
+    generator = CandidateGenerator(index, ann_candidates=50, popular_candidates=20, exact_rows=0)
+    now = time.time()
+    generator.update_stats((i, now - i, i % 7, i % 11) for i in range(2000))
+    user_vec = index.user_vector([1, 2, 3])
+    errors, done = [], threading.Event()
+
+    def serve():
+        while not done.is_set():
+            try:
+                rows = generator.generate(user_vec, exclude_rows=[1, 2, 3])
+                assert len(rows) == len(set(rows)) and all(r in index for r in rows)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=serve) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for start in range(2000, 3000, 50):
+        index.add((i, " ".join(rng.choice(words, 5))) for i in range(start, start + 50))
+        generator.update_stats((i, now, 0, 0) for i in range(start, start + 50))
+    done.set()
+    for t in threads:
+        t.join()
+    assert not errors
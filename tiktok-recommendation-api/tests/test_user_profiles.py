@@ -0,0 +1,127 @@
+import threading
+
+import numpy as np
+
+from caption_index import CaptionIndex, normalize
+from benchmarks.fake_mongo import FakeDB
+from user_profiles import InteractionTailer, ItemIdMap, UserProfile, UserProfileStore
+
+WORDS = [f"w{i}" for i in range(150)]
+
+
+def catalog(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return CaptionIndex().fit((f"v{i}", " ".join(rng.choice(WORDS, 5))) for i in range(n))
+
+
+def full_vector(index, liked_ids):
+    mean, _ = index.mean_vector(liked_ids)
+    return None if mean is None else normalize(mean)
+
+
+def profile_for(item_ids, liked_ids):
+    return UserProfile(item_ids.assign(liked_ids), [], liked_ids)
+
+
+def test_incremental_vector_matches_full_recompute():
+    index, item_ids = catalog(), ItemIdMap()
+    rng = np.random.default_rng(1)
+    liked = [f"v{i}" for i in rng.choice(400, 30, replace=False)]
+    profile = profile_for(item_ids, liked)
+    profile.preference_vector(index, item_ids)
+
+    for step in range(200):
+        vid = f"v{rng.integers(400)}"
+        item = int(item_ids.assign([vid])[0])
+        if vid in liked:
+            profile.remove_like(item, vid)
+            liked.remove(vid)
+        else:
+            profile.add_like(item, vid)
+            liked.append(vid)
+        if step % 7 == 0:
+            assert np.allclose(profile.preference_vector(index, item_ids), full_vector(index, liked), atol=1e-5)
+    assert np.allclose(profile.preference_vector(index, item_ids), full_vector(index, liked), atol=1e-5)
+
+
+def test_unliking_everything_clears_the_vector():
+    index, item_ids = catalog(), ItemIdMap()
+    profile = profile_for(item_ids, ["v1", "v2"])
+    assert profile.preference_vector(index, item_ids) is not None
+    profile.remove_like(int(item_ids.get("v1")), "v1")
+    profile.remove_like(int(item_ids.get("v2")), "v2")
+    assert profile.preference_vector(index, item_ids) is None
+
+
+def test_vector_recomputed_after_refit():
+    index, item_ids = catalog(), ItemIdMap()
+    profile = profile_for(item_ids, ["v3", "v4", "v5"])
+    profile.preference_vector(index, item_ids)
+    index.fit((f"v{i}", f"w{i % 20} w{(i * 7) % 150}") for i in range(400))
+    assert np.allclose(profile.preference_vector(index, item_ids), full_vector(index, ["v3", "v4", "v5"]))
+
+
+def test_concurrent_events_and_reads_lose_no_delta():
+    index, item_ids = catalog(), ItemIdMap()
+    store = UserProfileStore(lambda: None, item_ids=item_ids)
+    profile = profile_for(item_ids, ["v0"])
+    store._store("u", profile)
+    events = [("like", f"v{i}") for i in range(1, 300)] + [("dislike", f"v{i}") for i in range(1, 300, 3)]
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            profile.preference_vector(index, item_ids)
+
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for t in readers:
+        t.start()
+    for event, vid in events:
+        store.apply(event, "u", vid)
+    done.set()
+    for t in readers:
+        t.join()
+
+    liked = ["v0"] + [f"v{i}" for i in range(1, 300) if (i - 1) % 3]
+    assert np.allclose(profile.preference_vector(index, item_ids), full_vector(index, liked), atol=1e-5)
+
+
+def test_memo_keeps_one_entry_per_name():
+    profile = UserProfile([1, 2], [3], [])
+    for stamp in range(50):
+        profile.memo("exclude_rows", lambda: stamp, stamp=stamp)
+    assert len(profile._memo) == 1
+    assert profile.memo("exclude_rows", lambda: -1, stamp=49) == 49
+    assert list(profile.seen) == [1, 2, 3]
+
+
+def test_tailer_follows_created_at():
+    db = FakeDB(latency=0)
+    db.Likes.insert_many([{"userId": "u", "videoId": "old", "createdAt": 10}])
+    events = []
+    tailer = InteractionTailer(lambda: db, UserProfileStore(lambda: db), listeners=[lambda *e: events.append(e)])
+    tailer.poll()  # starts at the newest document
+    db.Likes.insert_many([{"userId": "u", "videoId": f"v{i}", "createdAt": 20 + i} for i in range(3)])
+    db.Views.insert_many([{"userId": "u", "videoId": "v9", "createdAt": 30}])
+    tailer.poll()
+    tailer.poll()
+    assert events == [("like", "u", "v0"), ("like", "u", "v1"), ("like", "u", "v2"), ("view", "u", "v9")]
+
+
+def test_remap_keeps_profiles_in_the_new_id_space():
+    db = FakeDB(latency=0)
+    db.Likes.insert_many([{"userId": "u", "videoId": v} for v in ("a", "b")])
+    db.Views.insert_many([{"userId": "u", "videoId": "c"}])
+    store = UserProfileStore(lambda: db)
+    store.item_ids.assign(["x", "y"])
+    profile = store.get("u")
+    store.apply("dislike", "u", "b")
+
+    snapshot_ids = ItemIdMap.from_ids(["c", "z", "a"])
+    store.remap(snapshot_ids)
+    assert store.get("u") is profile
+    assert store.counters["loads"] == 1
+    assert [snapshot_ids.video_id(i) for i in profile.liked] == ["a"]
+    assert [snapshot_ids.video_id(i) for i in profile.seen] == ["c", "a"]
+    index = CaptionIndex().fit([("a", "surf beach"), ("c", "cooking pasta")])
+    assert np.allclose(profile.preference_vector(index, snapshot_ids), full_vector(index, ["a"]))
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+from benchmarks.fake_mongo import FakeDB
+from worker_events import WorkerEvents
+
+
+def workers(db, n=2):
+    seen = [[] for _ in range(n)]
+    out = []
+    for log in seen:
+        events = WorkerEvents(lambda: db, {"dislike": lambda e, log=log: log.append((e["userId"], e["videoId"]))})
+        events.poll()  # starts at the newest event
+        out.append(events)
+    return out, seen
+
+
+def test_siblings_apply_events_once_and_skip_their_own():
+    db = FakeDB(latency=0)
+    (a, b), (seen_a, seen_b) = workers(db)
+    a.publish("dislike", userId="u1", videoId="v1")
+    a.publish("view", userId="u1", videoId="v2")
+    b.poll()
+    b.poll()
+    a.poll()
+    assert seen_b == [("u1", "v1")]
+    assert seen_a == []
+
+
+def test_late_event_inside_the_lookback_is_not_missed():
+    db = FakeDB(latency=0)
+    (a, b), (_, seen_b) = workers(db)
+    a.publish("dislike", userId="u1", videoId="v1")
+    b.poll()
+    # Written by a publisher whose clock is a second behind
+    late = datetime.utcnow() - timedelta(seconds=1)
+    db.RecommenderEvents.insert_one({"_id": 1, "type": "dislike", "userId": "u2", "videoId": "v2",
+                                     "origin": "c:1", "createdAt": late})
+    b.poll()
+    assert seen_b == [("u1", "v1"), ("u2", "v2")]
@@ -0,0 +1,362 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from caption_index import normalize
+
+logger = logging.getLogger(__name__)
+
+INTERACTION_PROJECTION = {"videoId": 1, "_id": 0}
+RECENT_LIKES = 50
+
+
+class ItemIdMap:
+    # Stable videoId <-> dense int32 mapping shared by the interaction stores
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._to_int = {}
+        self._to_id = []
+
+    @classmethod
+    def from_ids(cls, video_ids):
+        id_map = cls()
+        id_map._to_id = list(video_ids)
+        id_map._to_int = {vid: i for i, vid in enumerate(id_map._to_id)}
+        return id_map
+
+    def __len__(self):
+        return len(self._to_id)
+
+    def ids(self):
+        with self._lock:
+            return list(self._to_id)
+
+    def get(self, video_id):
+        return self._to_int.get(video_id)
+
+    def video_id(self, item):
+        return self._to_id[item]
+
+    def assign(self, video_ids):
+        out = np.empty(len(video_ids), dtype=np.int32)
+        with self._lock:
+            for i, vid in enumerate(video_ids):
+                item = self._to_int.get(vid)
+                if item is None:
+                    item = len(self._to_id)
+                    self._to_int[vid] = item
+                    self._to_id.append(vid)
+                out[i] = item
+        return out
+
+    def lookup(self, video_ids):
+        # -1 for videos never seen in any interaction
+        return np.fromiter((self._to_int.get(v, -1) for v in video_ids), dtype=np.int32, count=len(video_ids))
+
+
+def _contains(arr, item):
+    pos = np.searchsorted(arr, item)
+    return pos < len(arr) and arr[pos] == item
+
+
+def _insert(arr, item):
+    if _contains(arr, item):
+        return arr
+    return np.insert(arr, np.searchsorted(arr, item), item)
+
+
+def _remove(arr, item):
+    if not _contains(arr, item):
+        return arr
+    return np.delete(arr, np.searchsorted(arr, item))
+
+
+class UserProfile:
+    # liked/viewed items as sorted int32 arrays, memoised derived data
+    # (seen set, ...) invalidated whenever `version` changes, and a
+    # preference vector that like/unlike events update incrementally.
+    # `_lock` orders like/unlike deltas against folding them into the vector.
+
+    __slots__ = ("liked", "viewed", "recent_likes", "loaded_at", "version", "_memo", "_vector", "_vector_deltas",
+                 "_lock")
+
+    def __init__(self, liked, viewed, recent_likes, loaded_at=None):
+        self.liked = np.unique(np.asarray(liked, dtype=np.int32))
+        self.viewed = np.unique(np.asarray(viewed, dtype=np.int32))
+        self.recent_likes = list(recent_likes)
+        self.loaded_at = time.time() if loaded_at is None else loaded_at
+        self.version = 0
+        self._memo = {}
+        self._vector = None
+        self._vector_deltas = []
+        self._lock = threading.Lock()
+
+    def memo(self, name, compute, stamp=None):
+        # One entry per name, recomputed when the profile's version or the
+        # caller's `stamp` (e.g. the caption index version) changes
+        version = self.version
+        entry = self._memo.get(name)
+        if entry is not None and entry[0] == version and entry[1] == stamp:
+            return entry[2]
+        value = compute()
+        self._memo[name] = (version, stamp, value)
+        return value
+
+    @property
+    def seen(self):
+        return self.memo("seen", lambda: np.union1d(self.liked, self.viewed))
+
+    def seen_mask(self, items):
+        items = np.asarray(items, dtype=np.int32)
+        return np.isin(items, self.seen, assume_unique=False)
+
+    def preference_vector(self, caption_index, item_ids):
+        # Normalised mean of liked caption rows. Kept as (index version,
+        # unnormalised mean, row count) so pending like/unlike deltas are
+        # folded in without re-reading every liked row.
+        with self._lock:
+            deltas, self._vector_deltas = self._vector_deltas, []
+            state = self._vector
+            version = caption_index.version
+            if state is None or state[0] != version:
+                mean, count = caption_index.mean_vector([item_ids.video_id(i) for i in self.liked])
+            else:
+                _, mean, count = state
+                for video_id, sign in deltas:
+                    row = caption_index.row_vector(video_id)
+                    if row is None or count + sign < 0:
+                        continue
+                    if count + sign == 0:
+                        mean, count = None, 0
+                    elif mean is None:
+                        mean, count = row, 1
+                    else:
+                        mean = (mean * count + sign * row) / (count + sign)
+                        count += sign
+            self._vector = (version, mean, count)
+        return None if mean is None else normalize(mean)
+
+    def _changed(self):
+        self.version += 1
+
+    def add_like(self, item, video_id):
+        if _contains(self.liked, item):
+            return
+        with self._lock:
+            self.liked = _insert(self.liked, item)
+            self._vector_deltas.append((video_id, 1))
+        if video_id in self.recent_likes:
+            self.recent_likes.remove(video_id)
+        self.recent_likes.insert(0, video_id)
+        del self.recent_likes[RECENT_LIKES:]
+        self._changed()
+
+    def remove_like(self, item, video_id):
+        if not _contains(self.liked, item):
+            return
+        with self._lock:
+            self.liked = _remove(self.liked, item)
+            self._vector_deltas.append((video_id, -1))
+        if video_id in self.recent_likes:
+            self.recent_likes.remove(video_id)
+        self._changed()
+
+    def remap(self, old_items, new_items):
+        # old_items: sorted old ids covering liked/viewed; new_items: their new ids
+        with self._lock:
+            self.liked = np.unique(new_items[np.searchsorted(old_items, self.liked)])
+            self.viewed = np.unique(new_items[np.searchsorted(old_items, self.viewed)])
+            self._vector = None
+            self._vector_deltas = []
+        self._changed()
+
+    def add_view(self, item):
+        self.viewed = _insert(self.viewed, item)
+        self._changed()
+
+
+def _translate(profiles, old, new):
+    # Rewrite the profiles' item ids from the `old` ItemIdMap into `new`
+    arrays = [a for p in profiles for a in (p.liked, p.viewed) if len(a)]
+    used = np.unique(np.concatenate(arrays)) if arrays else np.empty(0, dtype=np.int32)
+    new_of = new.assign([old.video_id(i) for i in used])
+    for profile in profiles:
+        profile.remap(used, new_of)
+
+
+class UserProfileStore:
+    # Bounded LRU of UserProfile objects. Profiles are loaded with projected
+    # queries on first use and then kept current by apply() (write events
+    # from the Node backend and the InteractionTailer); `ttl` forces a full
+    # reload as a backstop against missed events.
+
+    def __init__(self, get_db, item_ids=None, maxsize=50000, ttl=3600):
+        self.get_db = get_db
+        self.item_ids = item_ids if item_ids is not None else ItemIdMap()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._profiles = OrderedDict()
+        self.counters = {"hits": 0, "loads": 0, "events": 0}
+
+    def _build(self, liked_ids, viewed_ids, item_ids):
+        recent = list(dict.fromkeys(reversed(liked_ids)))[:RECENT_LIKES]
+        return UserProfile(item_ids.assign(liked_ids), item_ids.assign(viewed_ids), recent)
+
+    def _cached(self, user_id, now):
+        profile = self._profiles.get(user_id)
+        if profile is None or now - profile.loaded_at > self.ttl:
+            return None
+        self._profiles.move_to_end(user_id)
+        return profile
+
+    def _store(self, user_id, profile):
+        self._profiles[user_id] = profile
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+
+    def get(self, user_id):
+        now = time.time()
+        with self._lock:
+            profile = self._cached(user_id, now)
+            if profile is not None:
+                self.counters["hits"] += 1
+                return profile
+        db = self.get_db()
+        liked = [d["videoId"] for d in db.Likes.find({"userId": user_id}, INTERACTION_PROJECTION) if "videoId" in d]
+        viewed = [d["videoId"] for d in db.Views.find({"userId": user_id}, INTERACTION_PROJECTION) if "videoId" in d]
+        item_ids = self.item_ids
+        profile = self._build(liked, viewed, item_ids)
+        with self._lock:
+            if self.item_ids is not item_ids:
+                # A snapshot swap remapped the store while we were loading
+                _translate([profile], item_ids, self.item_ids)
+            self.counters["loads"] += 1
+            self._store(user_id, profile)
+        return profile
+
+    def get_many(self, user_ids):
+        # One `$in` query per collection for every profile not already cached
+        now = time.time()
+        result, missing = {}, []
+        with self._lock:
+            for uid in user_ids:
+                profile = self._cached(uid, now)
+                if profile is None:
+                    missing.append(uid)
+                else:
+                    result[uid] = profile
+            self.counters["hits"] += len(result)
+        if missing:
+            db = self.get_db()
+            liked = {uid: [] for uid in missing}
+            viewed = {uid: [] for uid in missing}
+            projection = {"userId": 1, "videoId": 1, "_id": 0}
+            for d in db.Likes.find({"userId": {"$in": missing}}, projection):
+                if d.get("userId") in liked and "videoId" in d:
+                    liked[d["userId"]].append(d["videoId"])
+            for d in db.Views.find({"userId": {"$in": missing}}, projection):
+                if d.get("userId") in viewed and "videoId" in d:
+                    viewed[d["userId"]].append(d["videoId"])
+            with self._lock:
+                for uid in missing:
+                    profile = self._build(liked[uid], viewed[uid], self.item_ids)
+                    self._store(uid, profile)
+                    result[uid] = profile
+                self.counters["loads"] += len(missing)
+        return result
+
+    def apply(self, event_type, user_id, video_id):
+        # Returns True if a cached profile was updated; uncached users load fresh later
+        with self._lock:
+            self.counters["events"] += 1
+            profile = self._profiles.get(user_id)
+            if profile is None:
+                return False
+            item = int(self.item_ids.assign([video_id])[0])
+            if event_type == "like":
+                profile.add_like(item, video_id)
+            elif event_type == "dislike":
+                profile.remove_like(item, video_id)
+            elif event_type == "view":
+                profile.add_view(item)
+            else:
+                raise ValueError(f"Unknown interaction event: {event_type}")
+            return True
+
+    def remap(self, item_ids):
+        # Switch to a new item id space (a published snapshot), translating
+        # the cached profiles' items instead of reloading them all
+        with self._lock:
+            _translate(list(self._profiles.values()), self.item_ids, item_ids)
+            self.item_ids = item_ids
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, size=len(self._profiles), items=len(self.item_ids))
+
+
+class InteractionTailer:
+    # Polls Likes/Views for documents with createdAt past a watermark and
+    # feeds them to the profile store and any `listeners` (callables taking
+    # the same arguments as UserProfileStore.apply). Inserts only - unlikes
+    # arrive as events from the Node backend, and the store's TTL is the
+    # backstop. createdAt is the field the Like/View schemas index, so each
+    # poll is an index range scan rather than a collection scan and sort.
+
+    COLLECTIONS = (("Likes", "like"), ("Views", "view"))
+
+    FIELD = "createdAt"
+
+    def __init__(self, get_db, store, interval=5, batch_size=5000, listeners=()):
+        self.get_db = get_db
+        self.store = store
+        self.listeners = list(listeners)
+        self.interval = interval
+        self.batch_size = batch_size
+        self._watermarks = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def poll(self):
+        db = self.get_db()
+        applied = 0
+        for collection, event_type in self.COLLECTIONS:
+            watermark = self._watermarks.get(collection)
+            if watermark is None:
+                # Start from the newest document; history is loaded per user on demand
+                latest = list(db[collection].find({}, {self.FIELD: 1}).sort(self.FIELD, -1).limit(1))
+                self._watermarks[collection] = latest[0].get(self.FIELD) if latest else None
+                if self._watermarks[collection] is None:
+                    self._watermarks[collection] = 0
+                continue
+            query = {self.FIELD: {"$gt": watermark}} if watermark else {}
+            cursor = db[collection].find(query, {"userId": 1, "videoId": 1, self.FIELD: 1}) \
+                .sort(self.FIELD, 1).limit(self.batch_size)
+            for d in cursor:
+                if "userId" in d and "videoId" in d:
+                    applied += self.store.apply(event_type, d["userId"], d["videoId"])
+                    for listener in self.listeners:
+                        listener(event_type, d["userId"], d["videoId"])
+                if d.get(self.FIELD):
+                    self._watermarks[collection] = d[self.FIELD]
+        return applied
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Interaction tailer failed: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and self.interval > 0:
+                self.poll()
+                self._thread = threading.Thread(target=self._run, name="interaction-tailer", daemon=True)
+                self._thread.start()
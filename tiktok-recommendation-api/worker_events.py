@@ -0,0 +1,111 @@
+import os
+import time
+import socket
+import secrets
+import threading
+import logging
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerEvents:
+    # Fans cache events out to sibling worker processes through a Mongo
+    # collection. The worker that receives an event applies it itself
+    # and publish()es it; every worker polls the collection and runs
+    # `handlers[type](doc)` for the events other workers published.
+    #
+    # Publishers' createdAt values can interleave, so each poll re-reads the
+    # last `lookback` seconds and skips events it has already applied.
+    # Documents expire after `retention` seconds (TTL index on createdAt).
+
+    FIELD = "createdAt"
+
+    def __init__(self, get_db, handlers, collection="RecommenderEvents", interval=1, lookback=2, retention=3600):
+        self.get_db = get_db
+        self.handlers = dict(handlers)
+        self.collection = collection
+        self.interval = interval
+        self.lookback = timedelta(seconds=lookback)
+        self.retention = retention
+        self.origin = None
+        self._watermark = None
+        self._applied = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.counters = {"published": 0, "applied": 0, "failed": 0}
+
+    def _origin(self):
+        # Per process: the module may be imported before gunicorn forks
+        if self.origin is None or not self.origin.endswith(f":{os.getpid()}"):
+            self.origin = f"{socket.gethostname()}:{secrets.token_hex(4)}:{os.getpid()}"
+        return self.origin
+
+    def publish(self, event_type, **fields):
+        doc = dict(fields, _id=ObjectId(), type=event_type, origin=self._origin())
+        doc[self.FIELD] = datetime.utcnow()
+        try:
+            self.get_db()[self.collection].insert_one(doc)
+        except Exception as e:
+            # Siblings fall back on their TTLs for this event
+            logger.warning(f"Publishing {event_type} event failed: {e}")
+            return False
+        with self._lock:
+            self.counters["published"] += 1
+        return True
+
+    def poll(self):
+        coll = self.get_db()[self.collection]
+        if self._watermark is None:
+            # Start from the newest event; older ones are already in Mongo
+            latest = list(coll.find({}, {self.FIELD: 1}).sort(self.FIELD, -1).limit(1))
+            self._watermark = latest[0][self.FIELD] if latest else datetime.utcnow()
+            return 0
+        origin, applied = self._origin(), 0
+        since = self._watermark - self.lookback
+        for doc in coll.find({self.FIELD: {"$gt": since}}).sort(self.FIELD, 1):
+            if doc["_id"] in self._applied:
+                continue
+            self._applied[doc["_id"]] = doc[self.FIELD]
+            self._watermark = max(self._watermark, doc[self.FIELD])
+            handler = self.handlers.get(doc.get("type"))
+            if doc.get("origin") == origin or handler is None:
+                continue
+            try:
+                handler(doc)
+                applied += 1
+            except Exception as e:
+                logger.warning(f"Worker event {doc.get('type')} failed: {e}")
+                with self._lock:
+                    self.counters["failed"] += 1
+        since = self._watermark - self.lookback
+        self._applied = {k: t for k, t in self._applied.items() if t > since}
+        with self._lock:
+            self.counters["applied"] += applied
+        return applied
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Worker event poll failed: {e}")
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None and self.interval > 0:
+                try:
+                    self.get_db()[self.collection].create_index(self.FIELD, expireAfterSeconds=self.retention)
+                except Exception as e:
+                    logger.warning(f"Could not create the {self.collection} TTL index: {e}")
+                self.poll()
+                self._thread = threading.Thread(target=self._run, name="worker-events", daemon=True)
+                self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)